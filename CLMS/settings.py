@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so the timings cover the rest of the stack
+    'adminapp.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,11 +81,56 @@ WSGI_APPLICATION = 'CLMS.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Select the database with CLMS_DB: 'sqlite' (default, local development) or 'postgres'.
+CLMS_DB = os.environ.get('CLMS_DB', 'sqlite')
+
+if CLMS_DB == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('CLMS_DB_NAME', 'clms'),
+            'USER': os.environ.get('CLMS_DB_USER', 'clms'),
+            'PASSWORD': os.environ.get('CLMS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('CLMS_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('CLMS_DB_PORT', '5432'),
+        }
+    }
+    if os.environ.get('CLMS_DB_POOL', '1') == '1':
+        # Django's native psycopg 3 pool; it replaces persistent connections,
+        # so CONN_MAX_AGE must stay 0.
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('CLMS_DB_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('CLMS_DB_POOL_MAX', 10)),
+                'timeout': 10,
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CLMS_DB_CONN_MAX_AGE', 60))
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('CLMS_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock when the transaction starts so concurrent
+                # writers wait on busy_timeout instead of failing to upgrade.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
+
+# PRAGMAs applied to every new SQLite connection (see testapp/db.py).
+# journal_mode=WAL is recorded in the database file itself, so it persists:
+# any database opened here (the dev db.sqlite3 included) stays in WAL mode
+# and keeps -wal/-shm files beside it while in use.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
 }
 
 
@@ -106,6 +153,86 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Caches
+# Serialized user profiles are cached under the 'profiles' alias. Choose the
+# backend with CLMS_PROFILE_CACHE: 'locmem' (default, per process), 'file' or 'redis'.
+# Use a shared backend when running several worker processes. The listing only
+# sends ETag / Last-Modified with a shared backend (see adminapp/cache.py).
+USER_LISTING_CONDITIONAL_GET = os.environ.get('CLMS_LISTING_CONDITIONAL_GET', '1') != '0'
+
+PROFILE_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'clms-profiles',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CLMS_PROFILE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'profiles')),
+        # Room for the whole roster. Every set() lists the directory to decide
+        # whether to cull, so large rosters are better served by 'redis'.
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 10},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CLMS_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+THROTTLE_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'clms-throttle',
+        # Large enough that an attack from many addresses does not cull live buckets
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': PROFILE_CACHE_BACKENDS['redis'],
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'profiles': PROFILE_CACHE_BACKENDS[os.environ.get('CLMS_PROFILE_CACHE', 'locmem')],
+    # Throttle buckets; set CLMS_THROTTLE_CACHE to 'redis' to share them between workers
+    'throttle': THROTTLE_CACHE_BACKENDS[os.environ.get('CLMS_THROTTLE_CACHE', 'locmem')],
+}
+THROTTLE_CACHE_ALIAS = 'throttle'
+PROFILE_CACHE_ALIAS = 'profiles'
+PROFILE_CACHE_TIMEOUT = 300  # seconds; bounds staleness from writes that skip signals
+RELATIONSHIP_MAX_IDS = 1000  # ids per /user/parents/ or /user/students/ request
+
+
+# Password hashing
+# CLMS_PASSWORD_HASHER selects the hasher for new passwords: 'pbkdf2' (default) or
+# 'argon2' (needs argon2-cffi). Existing hashes from the other one still verify
+# and are rehashed on the next successful login.
+
+PASSWORD_HASHERS = [
+    'testapp.hashers.TunedPBKDF2PasswordHasher',
+    'testapp.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if os.environ.get('CLMS_PASSWORD_HASHER') == 'argon2':
+    PASSWORD_HASHERS[:2] = PASSWORD_HASHERS[1::-1]
+
+# Work factors; calibrate with `manage.py bench_hashers --target-ms 250`.
+# None keeps Django's default iteration count.
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ['CLMS_PBKDF2_ITERATIONS']) if 'CLMS_PBKDF2_ITERATIONS' in os.environ else None
+PASSWORD_ARGON2_PARAMS = {
+    'time_cost': 2,
+    'memory_cost': 65536,  # KiB
+    'parallelism': 2,
+}
+
+# Run registration and import hashing on a bounded 'thread' or 'process' pool. With None,
+# registrations hash inline and large imports use a 'process' pool of the same size.
+PASSWORD_HASHING_POOL = os.environ.get('CLMS_PASSWORD_HASHING_POOL') or None
+PASSWORD_HASHING_POOL_SIZE = 4
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -132,6 +259,23 @@ STATIC_ROOT = os.path.join(BASE_DIR,'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile images are stored under content-hash names with square JPEG thumbnails
+# (see testapp/images.py), rendered after commit on a small thread pool ('thread')
+# or in the request ('inline'). Backfill with `manage.py process_profile_images`.
+PROFILE_THUMBNAIL_SIZES = {'small': 64, 'medium': 256}
+PROFILE_IMAGE_PROCESSING = 'thread'
+PROFILE_IMAGE_WORKERS = 2
+
+# How /media/ responses are produced (see testapp/media.py), set with CLMS_MEDIA_SERVING:
+# 'file' streams from the worker with sendfile() where the WSGI server supports it;
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd) hand the file to the
+# front server. For nginx, map MEDIA_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT in an
+# `internal` location. Content-hash names are cached for a year, other files for
+# MEDIA_CACHE_MAX_AGE seconds.
+MEDIA_SERVING = os.environ.get('CLMS_MEDIA_SERVING', 'file')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 3600
+
 AUTH_USER_MODEL = 'testapp.User'
 
 # Default primary key field type
@@ -140,7 +284,10 @@ AUTH_USER_MODEL = 'testapp.User'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # EMAIL
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Set CLMS_EMAIL_BACKEND to e.g. django.core.mail.backends.console.EmailBackend
+# (or .filebased.EmailBackend, writing to EMAIL_FILE_PATH) to keep mail local.
+EMAIL_BACKEND = os.environ.get('CLMS_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 EMAIL_HOST = 'smtp.gmail.com'  # Use your email provider's SMTP server
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -148,12 +295,44 @@ EMAIL_HOST_USER = 'amalsanthosh527@gmail.com'  # Replace with your email address
 EMAIL_HOST_PASSWORD = ' kkda mxqn xebx uair '  # Replace with your email's app password or credentials
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbox worker (`manage.py send_outbox`, see adminapp/mail.py)
+EMAIL_OUTBOX_BATCH_SIZE = 100  # messages per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = 60  # seconds before the first retry, doubled on each failure
+EMAIL_OUTBOX_LEASE = 300  # seconds a claimed batch is hidden from other workers
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'testapp.authentication.SnapshotJWTAuthentication',
+    ),
+    # Uses orjson when installed, with the same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'testapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Proxies in front of the app whose X-Forwarded-For entries are trusted for
+    # throttle keys; 0 uses REMOTE_ADDR so clients cannot pick their own bucket.
+    'NUM_PROXIES': int(os.environ.get('CLMS_NUM_PROXIES', 0)),
+    # Token buckets for login and register (see testapp/throttling.py):
+    # `num/period` is both the burst size and the refill rate. Per-address
+    # buckets are shared by everyone behind one NAT (a school), so they only
+    # stop bulk spraying; the per-username bucket is what guards an account.
+    # CLMS_THROTTLING=0 lifts every rate, e.g. for a server under a load test.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '300/min',
+        'login_username': '5/min',
+        'register_ip': '100/hour',
+    } if os.environ.get('CLMS_THROTTLING', '1') != '0' else {
+        'login_ip': None,
+        'login_username': None,
+        'register_ip': None,
+    },
 }
 
+# Authenticated requests resolve to a cached user snapshot (see testapp/authentication.py)
+USER_SNAPSHOT_CACHE_SIZE = 10000
+USER_SNAPSHOT_CACHE_TTL = 60  # seconds
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -163,6 +342,24 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',)
 }
 
-
-
-
+# Blacklisted refresh tokens are checked against an in-memory index (see testapp/tokens.py)
+# that picks up tokens blacklisted by other workers at most this many seconds later.
+REVOCATION_INDEX_SYNC_INTERVAL = 5
+
+# Request metrics (see adminapp/metrics.py), exposed to admins at /metrics/.
+# Debug builds also log slow queries, and queries repeated from one line of
+# code within a request, together with the code that issued them.
+SLOW_QUERY_LOG = DEBUG
+SLOW_QUERY_THRESHOLD = 0.1  # seconds
+SLOW_QUERY_REPEAT_THRESHOLD = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'clms.queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import OutboxMessage
 
-# Register your models here.
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('recipient',)
@@ -0,0 +1,88 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from testapp.models import User, StudentProfile, ParentProfile, TeacherProfile, ParentStudentMapping
+from .serializers import user_profile_rows
+
+# Bump when the UserProfileSerializer output changes so old entries are ignored.
+PROFILE_CACHE_VERSION = 2
+
+
+def profile_cache():
+    return caches[getattr(settings, 'PROFILE_CACHE_ALIAS', 'default')]
+
+
+def profile_key(user_id):
+    return f'user-profile:{user_id}'
+
+
+def get_user_profiles(user_ids, roles=None):
+    """
+    Return `UserProfileSerializer` data for `user_ids`, in the same order,
+    skipping ids that do not exist. Cached entries come back in one multi-get;
+    misses are built by `user_profile_rows` and written back.
+    `roles` (the roles among `user_ids`, when known) narrows the eager loading.
+    """
+    cache = profile_cache()
+    keys = {user_id: profile_key(user_id) for user_id in user_ids}
+    found = cache.get_many(keys.values(), version=PROFILE_CACHE_VERSION)
+
+    missing = [user_id for user_id, key in keys.items() if key not in found]
+    if missing:
+        rows = user_profile_rows(User.objects.filter(id__in=missing), roles=roles)
+        fresh = {profile_key(row['id']): row for row in rows}
+        cache.set_many(fresh, timeout=getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300), version=PROFILE_CACHE_VERSION)
+        found.update(fresh)
+
+    return [found[key] for key in keys.values() if key in found]
+
+
+def invalidate_user_profiles(user_ids):
+    """
+    Drop the cached profiles for `user_ids`; call after writes that bypass
+    signals. Inside a transaction they are dropped again once it commits:
+    until then other connections still read the old rows, and a concurrent
+    read may have cached them again.
+    """
+    if not user_ids:
+        return
+    keys = [profile_key(user_id) for user_id in user_ids]
+    profile_cache().delete_many(keys, version=PROFILE_CACHE_VERSION)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: profile_cache().delete_many(keys, version=PROFILE_CACHE_VERSION))
+
+
+def listing_validators_enabled():
+    """
+    Whether the listing answers conditional GETs. The validators come from
+    database state but the body from the profile cache, so with a per-process
+    cache another worker's stale body could be stored under a current ETag;
+    they are only sent when every worker shares the cache.
+    """
+    return getattr(settings, 'USER_LISTING_CONDITIONAL_GET', True) and not isinstance(profile_cache(), LocMemCache)
+
+
+def user_listing_validators(request):
+    """
+    Return `(etag, last_modified)` for a `user_management` GET, derived from
+    the latest `modified` stamp and row count of the user and profile tables.
+    Row counts and the newest mapping id catch deletions, which leave no
+    timestamp behind, so clients should prefer If-None-Match.
+    """
+    state = [
+        model.objects.aggregate(modified=Max('modified'), count=Count('id'))
+        for model in (User, StudentProfile, ParentProfile, TeacherProfile)
+    ]
+    state.append(ParentStudentMapping.objects.aggregate(newest=Max('id'), count=Count('id')))
+    last_modified = max((row['modified'] for row in state[:4] if row['modified']), default=None)
+
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    seed = f"{PROFILE_CACHE_VERSION}|{request.get_full_path()}|{body}|{state}"
+    etag = '"%s"' % hashlib.md5(seed.encode(), usedforsecurity=False).hexdigest()
+    return etag, last_modified
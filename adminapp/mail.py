@@ -0,0 +1,116 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger('clms.mail')
+
+
+def queue_email(kind, recipient, subject, body):
+    """
+    Add a message to the outbox. Call it inside the transaction that makes
+    the change, so the mail is only sent if that change commits.
+    """
+    if not recipient:
+        return None
+    return OutboxMessage.objects.create(kind=kind, recipient=recipient, subject=subject, body=body)
+
+
+def queue_welcome_email(user):
+    body = f"Hello {user.username},\n\nAn account with the role '{user.role}' has been created for you on CLMS."
+    if not user.is_approved:
+        body += "\nYou will receive another email once an administrator approves it."
+    return queue_email('welcome', user.email, "Welcome to CLMS", body)
+
+
+APPROVAL_SUBJECT = "Your CLMS account has been approved"
+
+
+def approval_body(username):
+    return f"Hello {username},\n\nYour CLMS account has been approved. You can now log in."
+
+
+def queue_approval_email(user):
+    return queue_email('approval', user.email, APPROVAL_SUBJECT, approval_body(user.username))
+
+
+def queue_approval_emails(recipients):
+    """Bulk `queue_approval_email` for `(username, email)` pairs, in one INSERT."""
+    return OutboxMessage.objects.bulk_create([
+        OutboxMessage(kind='approval', recipient=email, subject=APPROVAL_SUBJECT, body=approval_body(username))
+        for username, email in recipients if email
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff: EMAIL_OUTBOX_BACKOFF seconds, doubled per failed attempt, capped at one day."""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 86400))
+
+
+def claim_due_messages(batch_size):
+    """
+    Lease up to `batch_size` due messages by pushing their `next_attempt_at`
+    forward. Concurrent workers skip leased rows, and rows leased by a
+    worker that died become due again when the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        lease = now + timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE', 300))
+        OutboxMessage.objects.filter(id__in=ids).update(next_attempt_at=lease)
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def send_outbox_batch(batch_size=None):
+    """
+    Deliver one batch of due messages over a single backend connection.
+    Failures are rescheduled with backoff until EMAIL_OUTBOX_MAX_ATTEMPTS,
+    then marked failed. Returns (sent, failed) counts.
+    """
+    messages = claim_due_messages(batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100))
+    if not messages:
+        return 0, 0
+
+    sent, failed = [], {}
+    try:
+        with get_connection() as connection:
+            for message in messages:
+                email = EmailMessage(message.subject, message.body, to=[message.recipient])
+                try:
+                    connection.send_messages([email])
+                    sent.append(message.id)
+                except Exception as exc:
+                    failed[message.id] = exc
+    except Exception as exc:
+        # Opening (or closing) the connection failed; retry whatever did not go out
+        for message in messages:
+            if message.id not in sent:
+                failed.setdefault(message.id, exc)
+
+    now = timezone.now()
+    OutboxMessage.objects.filter(id__in=sent).update(status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='')
+
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    retried = [message for message in messages if message.id in failed]
+    for message in retried:
+        message.attempts += 1
+        message.last_error = str(failed[message.id])[:1000]
+        if message.attempts >= max_attempts:
+            message.status = 'failed'
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+        logger.warning("Email %s to %s failed (attempt %d): %s", message.id, message.recipient, message.attempts, message.last_error)
+    OutboxMessage.objects.bulk_update(retried, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return len(sent), len(retried)
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from testapp.models import User, StudentProfile, TeacherProfile, ParentProfile, ParentStudentMapping
+from testapp.renderers import FastJSONRenderer
+from adminapp.serializers import UserProfileSerializer, user_profile_rows
+
+
+class Command(BaseCommand):
+    """
+    Compares `UserProfileSerializer` + `JSONRenderer` with the `values()`
+    fast path + `FastJSONRenderer` on rosters of increasing size, checking
+    that both produce the same bytes.
+    """
+    help = "Benchmark the DRF profile serializer against the fast values() path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def time(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    def seed(self, total):
+        # Thirds of students, teachers and parents, each parent mapped to one student
+        users = User.objects.bulk_create(
+            (User(username=f'bench_ser_{n}', email=f'bench_ser_{n}@example.com', password='!',
+                  role=('student', 'teacher', 'parent')[n % 3], is_approved=True) for n in range(total)),
+            batch_size=5000,
+        )
+        students = StudentProfile.objects.bulk_create(
+            (StudentProfile(user=user) for user in users if user.role == 'student'), batch_size=5000,
+        )
+        TeacherProfile.objects.bulk_create(
+            (TeacherProfile(user=user) for user in users if user.role == 'teacher'), batch_size=5000,
+        )
+        parents = ParentProfile.objects.bulk_create(
+            (ParentProfile(user=user, relationship='Mother') for user in users if user.role == 'parent'),
+            batch_size=5000,
+        )
+        ParentStudentMapping.objects.bulk_create(
+            (ParentStudentMapping(parent=parent, student=student) for parent, student in zip(parents, students)),
+            batch_size=5000,
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        for total in options['sizes']:
+            # Each size runs in its own rolled-back transaction so the database is untouched.
+            with transaction.atomic():
+                self.stdout.write(f"Creating {total} users...")
+                self.seed(total)
+                users = User.objects.filter(username__startswith='bench_ser_').order_by('id')
+
+                # Per-user serialization is the path single-user reads take
+                profiled = users.select_related('student_profile', 'teacher_profile', 'parent_profile')
+                drf_time, drf_bytes = self.time(lambda: JSONRenderer().render(
+                    [UserProfileSerializer(user).data for user in profiled]
+                ), repeat)
+                fast_time, fast_bytes = self.time(
+                    lambda: FastJSONRenderer().render(user_profile_rows(users)), repeat,
+                )
+                self.stdout.write(
+                    f"{total} users: serializer {drf_time * 1e3:.0f} ms, fast path {fast_time * 1e3:.0f} ms "
+                    f"({drf_time / fast_time:.1f}x), identical output: {drf_bytes == fast_bytes}"
+                )
+                transaction.set_rollback(True)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from testapp.models import User, StudentProfile
+from adminapp.cache import profile_cache
+from adminapp.views import user_management
+
+
+class Command(BaseCommand):
+    """
+    Measures latency and payload size of GET /user/ variants (full page,
+    filters, prefix search, field projection) against a large user table.
+    """
+    help = "Benchmark the admin user listing with filters and field projection."
+
+    VARIANTS = [
+        ('full page', {}),
+        ('role=student', {'role': 'student'}),
+        ('search prefix', {'search': 'bench_list_4'}),
+        ('fields=id,username', {'fields': 'id,username'}),
+        ('fields=id,username,role_data', {'fields': 'id,username,role_data'}),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        total = options['users']
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+
+        # Everything runs in a rolled-back transaction so the database is untouched.
+        with transaction.atomic():
+            self.stdout.write(f"Creating {total} users...")
+            admin = User.objects.create(username='bench_list_admin', email='bench_list_admin@example.com',
+                                        password='!', role='admin', is_approved=True)
+            users = User.objects.bulk_create(
+                (User(username=f'bench_list_{n}', email=f'bench_list_{n}@example.com', password='!',
+                      role='student' if n % 2 else 'teacher', is_approved=True) for n in range(total)),
+                batch_size=5000,
+            )
+            StudentProfile.objects.bulk_create(
+                (StudentProfile(user=user) for user in users if user.role == 'student'), batch_size=5000,
+            )
+
+            for label, params in self.VARIANTS:
+                params = dict(params, page_size=options['page_size'])
+                elapsed = 0.0
+                for _ in range(options['repeat']):
+                    profile_cache().clear()
+                    request = factory.get('/user/', params)
+                    force_authenticate(request, user=admin)
+                    start = time.perf_counter()
+                    response = user_management(request)
+                    response.render()
+                    elapsed += time.perf_counter() - start
+                self.stdout.write(
+                    f"{label}: {elapsed / options['repeat'] * 1e3:.1f} ms, {len(response.content)} bytes"
+                )
+            transaction.set_rollback(True)
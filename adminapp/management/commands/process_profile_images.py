@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from testapp.images import discard_upload, render_profile_image
+from testapp.models import User
+from adminapp.cache import invalidate_user_profiles
+
+
+class Command(BaseCommand):
+    """
+    Backfills content-hash names and thumbnails for users the post_save hook
+    never saw (bulk imports, seeded data, rows from before the pipeline).
+    Each distinct image is processed once, then its users are updated in
+    batches.
+    """
+    help = "Generate thumbnails for profile images that do not have current ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = {}
+        for user_id, image, thumbnails in User.objects.exclude(profile_image='').values_list(
+            'id', 'profile_image', 'profile_thumbnails'
+        ).iterator(chunk_size=batch_size):
+            if (thumbnails or {}).get('source') != image:
+                pending.setdefault(image, []).append(user_id)
+
+        for image, user_ids in pending.items():
+            name, thumbnails = render_profile_image(image)
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                # update() skips the signals, so refresh the cached profiles here
+                User.objects.filter(id__in=batch).update(
+                    profile_image=name, profile_thumbnails=thumbnails, modified=timezone.now(),
+                )
+                invalidate_user_profiles(batch)
+            discard_upload(image, name)
+
+        self.stdout.write(
+            f"Processed {len(pending)} images for {sum(len(ids) for ids in pending.values())} users."
+        )
@@ -0,0 +1,160 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from testapp.models import User, StudentProfile, TeacherProfile, ParentProfile, ParentStudentMapping
+from adminapp.signals import delete_invalidation_suspended
+
+DEFAULT_DISTRIBUTION = 'student=70,parent=20,teacher=8,admin=1,guest=1'
+DEFAULT_NOW = '2026-09-01T00:00:00+00:00'  # join dates fall in the two years before this
+RELATIONSHIPS = ['Mother', 'Father', 'Guardian']
+
+
+def parse_distribution(value):
+    """'student=70,parent=20,...' -> {role: weight} over User.ROLE_CHOICES."""
+    roles = dict(User.ROLE_CHOICES)
+    weights = {}
+    for part in value.split(','):
+        role, _, weight = part.partition('=')
+        role = role.strip()
+        if role not in roles:
+            raise CommandError(f"Unknown role '{role}'; choose from {', '.join(roles)}.")
+        try:
+            weights[role] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{role}': {weight!r}")
+    if sum(weights.values()) <= 0:
+        raise CommandError("The distribution needs at least one positive weight.")
+    return weights
+
+
+def parse_fan_out(value):
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high or low)
+    if low < 0 or high < low:
+        raise CommandError(f"Invalid --children range: {value}")
+    return low, high
+
+
+class Command(BaseCommand):
+    """
+    Generates a synthetic roster for scale testing: users across
+    `User.ROLE_CHOICES`, their role profiles and parent-student mappings.
+    Everything is derived from --seed, so the same arguments give the same
+    data. Users share one precomputed password hash and are written with
+    `bulk_create` one batch per transaction, so signals do not fire: run
+    `process_profile_images` afterwards if thumbnails are needed.
+    """
+    help = "Fill the database with a deterministic synthetic LMS roster."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--distribution', default=DEFAULT_DISTRIBUTION,
+                            help=f"Role weights (default: {DEFAULT_DISTRIBUTION})")
+        parser.add_argument('--children', default='1-3', help="Students mapped to each parent, as min-max")
+        parser.add_argument('--approved', type=float, default=0.9, help="Fraction of approved users")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password123', help="Password for every generated user")
+        parser.add_argument('--prefix', default='seed_', help="Username prefix for generated users")
+        parser.add_argument('--clear', action='store_true', help="Delete users with --prefix first")
+        parser.add_argument('--now', default=DEFAULT_NOW,
+                            help=f"Reference time for join dates, ISO 8601 with offset (default: {DEFAULT_NOW})")
+
+    def handle(self, *args, **options):
+        total = options['users']
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+        weights = parse_distribution(options['distribution'])
+        fan_out = parse_fan_out(options['children'])
+        rng = random.Random(options['seed'])
+        try:
+            now = parse_datetime(options['now'])
+        except ValueError:
+            now = None
+        if now is None or now.tzinfo is None:
+            raise CommandError(f"Invalid --now: {options['now']!r}; use ISO 8601 with a UTC offset.")
+
+        existing = User.objects.filter(username__startswith=prefix)
+        if options['clear']:
+            self.clear(existing, batch_size)
+        elif existing.exists():
+            raise CommandError(f"Users starting with '{prefix}' already exist; pass --clear or another --prefix.")
+
+        # Exact role counts from the weights, then shuffled so roles interleave
+        roles = list(weights)
+        scale = total / sum(weights.values())
+        counts = {role: int(weights[role] * scale) for role in roles}
+        counts[max(roles, key=weights.get)] += total - sum(counts.values())
+        assignment = [role for role in roles for _ in range(counts[role])]
+        rng.shuffle(assignment)
+
+        password = make_password(options['password'])  # hashed once, shared by every user
+        student_ids = []  # StudentProfile ids created so far, for parents to map to
+        mappings = 0
+        start = time.perf_counter()
+
+        for offset in range(0, total, batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{prefix}{n}',
+                        email=f'{prefix}{n}@example.com',
+                        password=password,
+                        role=assignment[n],
+                        is_approved=rng.random() < options['approved'],
+                        phone_number=f'9{rng.randrange(10 ** 9):09d}',
+                        date_joined=now - timedelta(seconds=rng.randrange(2 * 365 * 86400)),
+                    )
+                    for n in range(offset, min(offset + batch_size, total))
+                ])
+                students = StudentProfile.objects.bulk_create(
+                    [StudentProfile(user=user) for user in users if user.role == 'student']
+                )
+                TeacherProfile.objects.bulk_create([TeacherProfile(user=user) for user in users if user.role == 'teacher'])
+                parents = ParentProfile.objects.bulk_create([
+                    ParentProfile(user=user, relationship=rng.choice(RELATIONSHIPS))
+                    for user in users if user.role == 'parent'
+                ])
+                student_ids.extend(student.id for student in students)
+
+                links = []
+                for parent in parents:
+                    wards = min(rng.randint(*fan_out), len(student_ids))
+                    links.extend(
+                        ParentStudentMapping(parent_id=parent.id, student_id=student_id)
+                        for student_id in rng.sample(student_ids, wards)
+                    )
+                ParentStudentMapping.objects.bulk_create(links)
+                mappings += len(links)
+
+            done = min(offset + batch_size, total)
+            self.stdout.write(f"  {done}/{total} users ({time.perf_counter() - start:.1f}s)")
+
+        summary = ', '.join(f"{counts[role]} {role}" for role in roles)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {total} users ({summary}) and {mappings} parent-student mappings "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
+
+    def clear(self, queryset, batch_size):
+        """
+        Delete generated users in id batches. The cache invalidation receivers
+        are disconnected meanwhile, so each batch is a few bulk DELETEs
+        (cascading as usual) rather than several queries per user.
+        """
+        deleted = 0
+        with delete_invalidation_suspended():
+            while True:
+                ids = list(queryset.values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                with transaction.atomic():
+                    User.objects.filter(id__in=ids).delete()
+                deleted += len(ids)
+        self.stdout.write(f"Deleted {deleted} existing users.")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from adminapp.mail import send_outbox_batch
+
+
+class Command(BaseCommand):
+    """
+    Outbox worker: delivers queued emails in batches, one backend connection
+    per batch, sleeping while nothing is due.
+    """
+    help = "Send queued outbox emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--once', action='store_true', help="Exit once no messages are due.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_outbox_batch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(f"Sent {total_sent} emails, {total_failed} failed attempts.")
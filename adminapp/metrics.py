@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('clms.queries')
+
+# Bucket upper bounds (seconds, or queries for the count histogram)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram keyed by a label value. An observation is one
+    bisect plus a few additions under a lock, so it is cheap enough to update
+    on every request.
+    """
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # label -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, label, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label)
+            if series is None:
+                series = self.series[label] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self, label_name):
+        """Prometheus text exposition; bucket counts are cumulative."""
+        with self.lock:
+            snapshot = {label: list(series) for label, series in self.series.items()}
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label in sorted(snapshot):
+            series = snapshot[label]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {series[-1]}')
+        return lines
+
+
+request_duration = Histogram(
+    'clms_request_duration_seconds', 'Wall time spent producing the response.', LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    'clms_request_queries', 'SQL queries executed per request.', QUERY_COUNT_BUCKETS,
+)
+request_query_duration = Histogram(
+    'clms_request_query_duration_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS,
+)
+HISTOGRAMS = (request_duration, request_queries, request_query_duration)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render('view'))
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+def query_origin():
+    """Innermost project frame (not Django or a dependency), as 'path:line in func'."""
+    base = str(settings.BASE_DIR) + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        if not frame.filename.startswith(base) or frame.filename == __file__ or 'site-packages' in frame.filename:
+            continue
+        return f'{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryRecorder:
+    """
+    `connection.execute_wrapper` that counts queries and sums their time.
+    With `log_slow` it also logs queries slower than `slow_threshold`, and
+    statements repeated `repeat_threshold` times from the same line (the
+    shape of an N+1), each with the code that issued it.
+    """
+    def __init__(self, log_slow=False, slow_threshold=0.1, repeat_threshold=10):
+        self.count = 0
+        self.duration = 0.0
+        self.log_slow = log_slow
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.repeats = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.log_slow:
+                self.inspect(sql, elapsed)
+
+    def inspect(self, sql, elapsed):
+        origin = None
+        if elapsed >= self.slow_threshold:
+            origin = query_origin()
+            logger.warning("Slow query (%.1f ms) from %s: %s", elapsed * 1e3, origin, sql)
+        key = (sql, origin or query_origin())
+        self.repeats[key] += 1
+        if self.repeats[key] == self.repeat_threshold:
+            logger.warning("Query repeated %d times from %s: %s", self.repeat_threshold, key[1], sql)
+
+
+def execute_wrappers():
+    return connection.execute_wrappers
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, SQL query count and SQL time for every request,
+    labelled by URL name (unresolved paths are grouped as 'unmatched').
+    Streaming responses are timed until the view returns, not while the body streams.
+    Supports both sync and async chains, so under ASGI it is not adapted
+    onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self.recorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self.observe(request, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = self.recorder()
+        # Connections are per thread: the ORM runs on the thread-sensitive
+        # sync_to_async thread, so the wrapper goes on that thread's connection.
+        wrappers = await sync_to_async(execute_wrappers)()
+        start = time.perf_counter()
+        wrappers.append(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrappers.remove(recorder)
+        self.observe(request, time.perf_counter() - start, recorder)
+        return response
+
+    def recorder(self):
+        return QueryRecorder(
+            log_slow=getattr(settings, 'SLOW_QUERY_LOG', settings.DEBUG),
+            slow_threshold=getattr(settings, 'SLOW_QUERY_THRESHOLD', 0.1),
+            repeat_threshold=getattr(settings, 'SLOW_QUERY_REPEAT_THRESHOLD', 10),
+        )
+
+    def observe(self, request, elapsed, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        request_duration.observe(view, elapsed)
+        request_queries.observe(view, recorder.count)
+        request_query_duration.observe(view, recorder.duration)
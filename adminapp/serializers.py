@@ -1,6 +1,16 @@
 from testapp.models import User, ParentProfile, StudentProfile, TeacherProfile, ParentStudentMapping
+from testapp.authentication import invalidate_user_snapshot
+from testapp.hashers import get_hashing_executor, hash_password, hashing_pool
+from testapp.images import avatar_urls
+from .mail import queue_approval_email
+from collections import Counter
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q, QuerySet
 
 
 # class AdminUserCreationSerializer(serializers.ModelSerializer):
@@ -69,6 +79,197 @@ from django.contrib.auth.hashers import make_password
 
 #         return user
 
+
+def find_invalid_student_id(student_ids):
+    """
+    Return the first ID in `student_ids` that is not an existing student with a
+    profile, or None when they are all valid. Runs a single query.
+    """
+    valid = set(
+        StudentProfile.objects.filter(user_id__in=student_ids, user__role='student').values_list('user_id', flat=True)
+    )
+    return next((student_id for student_id in student_ids if student_id not in valid), None)
+
+
+def add_parent_students(parent_profile, student_ids):
+    """Map the students with the given user IDs to `parent_profile` in one insert."""
+    profile_ids = StudentProfile.objects.filter(user_id__in=student_ids).values_list('id', flat=True)
+    ParentStudentMapping.objects.bulk_create(
+        [ParentStudentMapping(parent=parent_profile, student_id=profile_id) for profile_id in profile_ids],
+        ignore_conflicts=True,
+    )
+
+
+def sync_parent_students(parent_profile, student_ids):
+    """
+    Make the students mapped to `parent_profile` match `student_ids`, only
+    deleting and inserting the mappings that actually changed.
+    """
+    current = set(parent_profile.student_mappings.values_list('student__user_id', flat=True))
+    wanted = set(student_ids)
+    if current - wanted:
+        parent_profile.student_mappings.filter(student__user_id__in=current - wanted).delete()
+    if wanted - current:
+        add_parent_students(parent_profile, wanted - current)
+
+
+# Profile model each role gets when approved or edited
+ROLE_PROFILE_MODELS = {'student': StudentProfile, 'teacher': TeacherProfile, 'parent': ParentProfile}
+
+
+def create_missing_profiles(users):
+    """
+    Give each `(user_id, role)` in `users` its role profile if it has none:
+    one lookup and one `bulk_create` per role. Returns how many profiles were
+    missing at the lookup, an upper bound on the rows inserted here: one that
+    a concurrent edit creates in between is skipped by ignore_conflicts but
+    still counted, and bulk_create cannot report which rows it skipped.
+    """
+    created = 0
+    for role, model in ROLE_PROFILE_MODELS.items():
+        user_ids = [user_id for user_id, user_role in users if user_role == role]
+        if not user_ids:
+            continue
+        existing = set(model.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        missing = [model(user_id=user_id) for user_id in user_ids if user_id not in existing]
+        # A concurrent edit may have added one meanwhile; the unique user_id keeps it
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        created += len(missing)
+    return created
+
+
+# Below this many rows hashing in-process is cheaper than using the pool.
+BULK_HASH_POOL_THRESHOLD = 50
+
+
+def hash_passwords(passwords):
+    """
+    Hash a batch of passwords. Large batches are spread over the shared
+    PASSWORD_HASHING_POOL, so bulk imports and registrations are bounded by
+    the same pool; when none is configured they still get a process pool of
+    PASSWORD_HASHING_POOL_SIZE, so the PBKDF2 cost scales with the cores.
+    """
+    if len(passwords) < BULK_HASH_POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    executor = get_hashing_executor() or hashing_pool('process', getattr(settings, 'PASSWORD_HASHING_POOL_SIZE', None))
+    return list(executor.map(make_password, passwords, chunksize=16))
+
+
+class AdminUserBulkCreationSerializer(serializers.ListSerializer):
+    """
+    List serializer used by `AdminUserCreationSerializer(many=True)` to import
+    many users at once. Each row goes through the regular field validation,
+    while the uniqueness and student ID checks run once for the whole batch.
+    Errors are reported per row, keyed by the row index.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of users.']})
+        if not data:
+            raise serializers.ValidationError({'non_field_errors': ['No users to import.']})
+
+        # Username uniqueness is checked set-based below instead of one query per row.
+        username_field = self.child.fields['username']
+        username_field.validators = [
+            validator for validator in username_field.validators if not isinstance(validator, UniqueValidator)
+        ]
+
+        rows = {}
+        errors = {}
+        for index, item in enumerate(data):
+            try:
+                rows[index] = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+
+        def add_error(index, field, message):
+            errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+        usernames = Counter(row['username'] for row in rows.values())
+        emails = Counter(row.get('email') for row in rows.values() if row.get('email'))
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        requested_ids = {
+            student_id
+            for row in rows.values() if row['role'] == 'parent'
+            for student_id in row.get('student_ids', [])
+        }
+        valid_student_ids = set(
+            StudentProfile.objects.filter(user_id__in=requested_ids, user__role='student').values_list('user_id', flat=True)
+        )
+
+        for index, row in rows.items():
+            if row['username'] in taken_usernames:
+                add_error(index, 'username', 'A user with that username already exists.')
+            elif usernames[row['username']] > 1:
+                add_error(index, 'username', 'Username is duplicated in this import.')
+            email = row.get('email')
+            if email in taken_emails:
+                add_error(index, 'email', 'Email is already taken.')
+            elif email and emails[email] > 1:
+                add_error(index, 'email', 'Email is duplicated in this import.')
+            if row['role'] == 'parent':
+                for student_id in row.get('student_ids', []):
+                    if student_id not in valid_student_ids:
+                        add_error(index, 'student_ids', f"Invalid student ID: {student_id}")
+
+        if errors:
+            raise serializers.ValidationError(dict(sorted(errors.items())))
+        return [rows[index] for index in sorted(rows)]
+
+    def create(self, validated_data):
+        passwords = hash_passwords([row['password'] for row in validated_data])
+
+        users = []
+        extras = []
+        for row, password in zip(validated_data, passwords):
+            row = dict(row)
+            row.pop('password2')
+            extras.append((row.pop('student_ids', []), row.pop('relationship', None)))
+            row['password'] = password
+            users.append(User(**row))
+
+        try:
+            with transaction.atomic():
+                return self._bulk_create(users, extras)
+        except IntegrityError:
+            # Another request created one of these usernames or emails after validation
+            raise serializers.ValidationError({'non_field_errors': ['A user with one of these usernames or emails already exists.']})
+
+    def _bulk_create(self, users, extras):
+        users = User.objects.bulk_create(users)
+
+        student_profiles = []
+        teacher_profiles = []
+        parent_profiles = []
+        parent_student_ids = []
+        for user, (student_ids, relationship) in zip(users, extras):
+            if not user.is_approved:
+                continue
+            if user.role == 'student':
+                student_profiles.append(StudentProfile(user=user, enrollment_date=None))
+            elif user.role == 'parent':
+                parent_profiles.append(ParentProfile(user=user, relationship=relationship))
+                parent_student_ids.append(student_ids)
+            elif user.role == 'teacher':
+                teacher_profiles.append(TeacherProfile(user=user, enrollment_date=None))
+
+        StudentProfile.objects.bulk_create(student_profiles)
+        TeacherProfile.objects.bulk_create(teacher_profiles)
+        parent_profiles = ParentProfile.objects.bulk_create(parent_profiles)
+
+        wanted = {student_id for student_ids in parent_student_ids for student_id in student_ids}
+        profile_ids = dict(StudentProfile.objects.filter(user_id__in=wanted).values_list('user_id', 'id'))
+        ParentStudentMapping.objects.bulk_create([
+            ParentStudentMapping(parent=parent_profile, student_id=profile_ids[student_id])
+            for parent_profile, student_ids in zip(parent_profiles, parent_student_ids)
+            for student_id in set(student_ids)
+        ], ignore_conflicts=True)
+
+        return users
+
+
 class AdminUserCreationSerializer(serializers.ModelSerializer):
     password2 = serializers.CharField(write_only=True, style={'input_type': 'password'})
     student_ids = serializers.ListField(
@@ -88,7 +289,10 @@ class AdminUserCreationSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password', 'password2', 'role', 'phone_number', 'is_approved', 'student_ids', 'relationship']
         extra_kwargs = {
             'password': {'write_only': True, 'style': {'input_type': 'password'}},
+            # Email uniqueness is checked in validate() with its own error message
+            'email': {'validators': []},
         }
+        list_serializer_class = AdminUserBulkCreationSerializer
 
     def validate(self, attrs):
         password = attrs.get('password')
@@ -97,9 +301,11 @@ class AdminUserCreationSerializer(serializers.ModelSerializer):
         role = attrs.get('role')
         student_ids = attrs.get('student_ids', [])
         relationship = attrs.get('relationship', None)
+        # Bulk imports run the database checks once for the whole batch
+        bulk = isinstance(self.parent, serializers.ListSerializer)
 
         # Email uniqueness check
-        if User.objects.filter(email=email).exists():
+        if not bulk and User.objects.filter(email=email).exists():
             raise serializers.ValidationError({'email': 'Email is already taken.'})
 
         # Password validation
@@ -117,9 +323,9 @@ class AdminUserCreationSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({"relationship": "Relationship is required for parent role."})
 
             # Ensure all provided student IDs exist and are valid
-            for student_id in student_ids:
-                if not User.objects.filter(id=student_id, role='student').exists():
-                    raise serializers.ValidationError({"student_ids": f"Invalid student ID: {student_id}"})
+            invalid_id = find_invalid_student_id(student_ids) if student_ids and not bulk else None
+            if invalid_id is not None:
+                raise serializers.ValidationError({"student_ids": f"Invalid student ID: {invalid_id}"})
 
         return attrs
 
@@ -127,23 +333,27 @@ class AdminUserCreationSerializer(serializers.ModelSerializer):
         validated_data.pop('password2')
         student_ids = validated_data.pop('student_ids', [])
         relationship = validated_data.pop('relationship', None)
-        validated_data['password'] = make_password(validated_data['password'])
-
-        # Create the user
-        user = User.objects.create(**validated_data)
-
-        # Create corresponding profile if `is_approved` is True
-        if validated_data.get('is_approved'):
-            if validated_data['role'] == 'student':
-                StudentProfile.objects.create(user=user, enrollment_date=None)
-            elif validated_data['role'] == 'parent':
-                # Use the relationship provided by the admin
-                parent_profile = ParentProfile.objects.create(user=user, relationship=relationship)
-                for student_id in student_ids:
-                    student_profile = StudentProfile.objects.get(user_id=student_id)
-                    ParentStudentMapping.objects.create(parent=parent_profile, student=student_profile)
-            elif validated_data['role'] == 'teacher':
-                TeacherProfile.objects.create(user=user, enrollment_date=None)
+        validated_data['password'] = hash_password(validated_data['password'])
+
+        try:
+            with transaction.atomic():
+                # Create the user
+                user = User.objects.create(**validated_data)
+
+                # Create corresponding profile if `is_approved` is True
+                if validated_data.get('is_approved'):
+                    if validated_data['role'] == 'student':
+                        StudentProfile.objects.create(user=user, enrollment_date=None)
+                    elif validated_data['role'] == 'parent':
+                        # Use the relationship provided by the admin
+                        parent_profile = ParentProfile.objects.create(user=user, relationship=relationship)
+                        if student_ids:
+                            add_parent_students(parent_profile, student_ids)
+                    elif validated_data['role'] == 'teacher':
+                        TeacherProfile.objects.create(user=user, enrollment_date=None)
+        except IntegrityError:
+            # Another request created the same username or email after validation
+            raise serializers.ValidationError({'error': 'A user with that username or email already exists.'})
 
         return user
 
@@ -178,13 +388,15 @@ class AdminUserEditSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({"relationship": "Relationship is required for parent role."})
 
             # Validate student IDs if provided
-            for student_id in student_ids:
-                if not User.objects.filter(id=student_id, role='student').exists():
-                    raise serializers.ValidationError({"student_ids": f"Invalid student ID: {student_id}"})
+            invalid_id = find_invalid_student_id(student_ids) if student_ids else None
+            if invalid_id is not None:
+                raise serializers.ValidationError({"student_ids": f"Invalid student ID: {invalid_id}"})
 
         return attrs
 
     def update(self, instance, validated_data):
+        was_approved = instance.is_approved
+
         # General user updates
         instance.username = validated_data.get('username', instance.username)
         instance.email = validated_data.get('email', instance.email)
@@ -206,13 +418,8 @@ class AdminUserEditSerializer(serializers.ModelSerializer):
             # Update parent-student mapping
             student_ids = validated_data.get('student_ids', [])
             if student_ids:
-                # Remove old mappings
-                ParentStudentMapping.objects.filter(parent=parent_profile).delete()
-
-                # Create new mappings
-                for student_id in student_ids:
-                    student_profile = StudentProfile.objects.get(user_id=student_id)
-                    ParentStudentMapping.objects.create(parent=parent_profile, student=student_profile)
+                # Only insert or delete the mappings that changed
+                sync_parent_students(parent_profile, student_ids)
 
         elif role == 'student':
             student_profile, created = StudentProfile.objects.get_or_create(user=instance)
@@ -221,21 +428,50 @@ class AdminUserEditSerializer(serializers.ModelSerializer):
             teacher_profile, created = TeacherProfile.objects.get_or_create(user=instance)
             teacher_profile.save()
 
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            # Sent later by the outbox worker, only if the approval commits
+            if instance.is_approved and not was_approved:
+                queue_approval_email(instance)
+        # The role and approval flags are cached for authentication
+        invalidate_user_snapshot(instance.id)
         return instance
 
 
 
+class UserProfileListSerializer(serializers.ListSerializer):
+    """
+    `many=True` side of `UserProfileSerializer`: the rows come from
+    `user_profile_rows`, in a fixed number of queries, instead of serializing
+    each user and loading its profile data one by one.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, QuerySet):
+            return user_profile_rows(data)
+        users = list(data)
+        rows = {row['id']: row for row in user_profile_rows(User.objects.filter(id__in=[user.id for user in users]))}
+        return [rows[user.id] for user in users if user.id in rows]
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer to include user-specific data along with role-based details.
     """
 
+    avatar = serializers.SerializerMethodField()
     role_data = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'role', 'is_approved', 'phone_number', 'role_data']
+        fields = ['id', 'username', 'email', 'role', 'is_approved', 'phone_number', 'avatar', 'role_data']
+        list_serializer_class = UserProfileListSerializer
+
+    # Fields that are not plain user columns
+    COMPUTED_FIELDS = ('avatar', 'role_data')
+
+    def get_avatar(self, obj):
+        return avatar_urls(obj.profile_image.name, obj.profile_thumbnails)
 
     def get_role_data(self, obj):
         # Add role-specific fields dynamically
@@ -250,7 +486,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         elif obj.role == 'parent' and hasattr(obj, 'parent_profile'):
             # Get all student profiles mapped to this parent
             parent_profile = obj.parent_profile
-            mapped_students = ParentStudentMapping.objects.filter(parent=parent_profile).select_related('student__user')
+            mapped_students = parent_profile.student_mappings.select_related('student__user').order_by('id')
 
             # Serialize student details
             students = [
@@ -274,3 +510,135 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return None
 
 
+
+
+class UserListingQuerySerializer(serializers.Serializer):
+    """
+    Query parameters accepted by the `user_management` listing: filters on
+    role, approval and join date, a prefix `search` over username and email,
+    and a comma separated `fields` projection of `UserProfileSerializer` fields.
+    """
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+    is_approved = serializers.BooleanField(required=False, allow_null=True, default=None)
+    joined_after = serializers.DateTimeField(required=False)
+    joined_before = serializers.DateTimeField(required=False)
+    search = serializers.CharField(required=False, max_length=150)
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value):
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in UserProfileSerializer.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}")
+        # Keep the serializer's field order so projected rows match full ones
+        return [field for field in UserProfileSerializer.Meta.fields if field in fields]
+
+    def filter_queryset(self, queryset):
+        params = self.validated_data
+        if 'role' in params:
+            queryset = queryset.filter(role=params['role'])
+        if params.get('is_approved') is not None:
+            queryset = queryset.filter(is_approved=params['is_approved'])
+        if 'joined_after' in params:
+            queryset = queryset.filter(date_joined__gte=params['joined_after'])
+        if 'joined_before' in params:
+            queryset = queryset.filter(date_joined__lt=params['joined_before'])
+        if params.get('search'):
+            queryset = queryset.filter(
+                Q(username__startswith=params['search']) | Q(email__startswith=params['search'])
+            )
+        return queryset
+
+
+class RelationshipQuerySerializer(serializers.Serializer):
+    """`ids`: comma separated user ids whose parents or students are wanted."""
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+        except ValueError:
+            raise serializers.ValidationError("ids must be comma separated integers.")
+        if not ids:
+            raise serializers.ValidationError("Pass at least one id.")
+        limit = getattr(settings, 'RELATIONSHIP_MAX_IDS', 1000)
+        if len(ids) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids per request.")
+        return ids
+
+
+class BulkApprovalSerializer(UserListingQuerySerializer):
+    """
+    Selection for `approve_users`: either explicit `ids`, or the listing
+    filters (role, join date, search) applied to users awaiting approval.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only pending users are selected, and nothing is listed back
+        del fields['is_approved'], fields['fields']
+        return fields
+
+    def validate(self, attrs):
+        filters = [name for name in ('role', 'joined_after', 'joined_before', 'search') if attrs.get(name)]
+        if 'ids' in attrs and filters:
+            raise serializers.ValidationError("Pass either ids or filters, not both.")
+        if 'ids' not in attrs and not filters:
+            raise serializers.ValidationError("Pass ids or at least one filter.")
+        return attrs
+
+
+# Columns each role needs on top of the plain user fields in `user_profile_rows`
+ROLE_PROFILE_COLUMNS = {
+    'student': ['student_profile__id', 'student_profile__enrollment_date'],
+    'teacher': ['teacher_profile__id', 'teacher_profile__enrollment_date'],
+    'parent': ['parent_profile__id', 'parent_profile__relationship'],
+}
+
+
+def user_profile_rows(queryset, roles=None):
+    """
+    Read-only fast path for `UserProfileSerializer`: builds the same dicts
+    (same keys, order and values) straight from `values()` rows, in two
+    queries and without per-field serializer overhead. `roles` (the roles in
+    `queryset`, when the caller knows them) saves the DISTINCT query and
+    limits the profile columns to those roles.
+    """
+    if roles is None:
+        roles = set(queryset.order_by().values_list('role', flat=True).distinct())
+    plain = [field for field in UserProfileSerializer.Meta.fields if field not in UserProfileSerializer.COMPUTED_FIELDS]
+    columns = plain + ['profile_image', 'profile_thumbnails']
+    columns += [column for role in sorted(roles) for column in ROLE_PROFILE_COLUMNS.get(role, [])]
+    rows = list(queryset.values(*columns))
+
+    students = {}
+    parent_ids = [row['parent_profile__id'] for row in rows if row['role'] == 'parent' and row.get('parent_profile__id')]
+    if parent_ids:
+        mappings = ParentStudentMapping.objects.filter(parent_id__in=parent_ids).order_by('id').values_list(
+            'parent_id', 'student__user__id', 'student__user__username', 'student__user__email', 'student__enrollment_date'
+        )
+        for parent_id, student_id, username, email, enrollment_date in mappings:
+            students.setdefault(parent_id, []).append({
+                "id": student_id,
+                "username": username,
+                "email": email,
+                "enrollment_date": enrollment_date,
+            })
+
+    result = []
+    for row in rows:
+        data = {field: row[field] for field in plain}
+        data['avatar'] = avatar_urls(row['profile_image'], row['profile_thumbnails'])
+        role = row['role']
+        if role in ('student', 'teacher') and row.get(f'{role}_profile__id'):
+            data['role_data'] = {"enrollment_date": row[f'{role}_profile__enrollment_date']}
+        elif role == 'parent' and row.get('parent_profile__id'):
+            data['role_data'] = {
+                "relationship": row['parent_profile__relationship'],
+                "students": students.get(row['parent_profile__id'], []),
+            }
+        else:
+            data['role_data'] = None
+        result.append(data)
+    return result
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from testapp.models import User, StudentProfile, ParentProfile, TeacherProfile, ParentStudentMapping
+from .cache import invalidate_user_profiles, profile_cache
+
+
+def parent_user_ids(student_user_id):
+    """User ids of the parents whose cached profiles list this student."""
+    return list(ParentStudentMapping.objects.filter(student__user_id=student_user_id).values_list('parent__user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    affected = [instance.id]
+    if instance.role == 'student':
+        affected += parent_user_ids(instance.id)
+    invalidate_user_profiles(affected)
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+def student_profile_changed(sender, instance, **kwargs):
+    invalidate_user_profiles([instance.user_id] + parent_user_ids(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=ParentProfile)
+@receiver([post_save, post_delete], sender=TeacherProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_user_profiles([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=ParentStudentMapping)
+def mapping_changed(sender, instance, **kwargs):
+    invalidate_user_profiles(list(ParentProfile.objects.filter(id=instance.parent_id).values_list('user_id', flat=True)))
+
+
+# The post_delete receivers above, by sender
+DELETE_RECEIVERS = [
+    (user_changed, User),
+    (student_profile_changed, StudentProfile),
+    (profile_changed, ParentProfile),
+    (profile_changed, TeacherProfile),
+    (mapping_changed, ParentStudentMapping),
+]
+
+
+@contextmanager
+def delete_invalidation_suspended():
+    """
+    Disconnect the post_delete receivers for a bulk purge, where they would
+    run queries for every deleted row and keep Django from deleting in bulk,
+    then clear the whole profile cache once. Affects every thread of the
+    process, so only use it in management commands.
+    """
+    for receiver_func, sender in DELETE_RECEIVERS:
+        post_delete.disconnect(receiver_func, sender=sender)
+    try:
+        yield
+    finally:
+        for receiver_func, sender in DELETE_RECEIVERS:
+            post_delete.connect(receiver_func, sender=sender)
+        profile_cache().clear()
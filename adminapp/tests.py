@@ -1,3 +1,840 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import AsyncClient, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from PIL import Image
+
+from testapp.hashers import get_hashing_executor, hashing_pool
+from testapp.models import User, StudentProfile, TeacherProfile, ParentProfile, ParentStudentMapping
+from testapp.renderers import FastJSONRenderer
+from . import metrics
+from .cache import PROFILE_CACHE_VERSION, get_user_profiles, profile_cache, profile_key
+from .mail import send_outbox_batch
+from .models import OutboxMessage
+from .serializers import UserProfileSerializer, BULK_HASH_POOL_THRESHOLD, user_profile_rows
+
+
+def make_user(username, role, **extra):
+    extra.setdefault('is_approved', True)
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass-1234', role=role, **extra
+    )
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminAPITestCase(TestCase):
+
+    def setUp(self):
+        profile_cache().clear()
+        self.admin = make_user('admin', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_family(self, index, wards=2):
+        students = []
+        for n in range(wards):
+            student = make_user(f'student{index}_{n}', 'student')
+            students.append(StudentProfile.objects.create(user=student))
+        parent = make_user(f'parent{index}', 'parent')
+        profile = ParentProfile.objects.create(user=parent, relationship='Mother')
+        for student in students:
+            ParentStudentMapping.objects.create(parent=profile, student=student)
+        teacher = make_user(f'teacher{index}', 'teacher')
+        TeacherProfile.objects.create(user=teacher)
+        return parent
+
+
+class UserListingTests(AdminAPITestCase):
+
+    def list_users(self, url='/user/', **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_listing_is_paginated_by_cursor(self):
+        for index in range(3):
+            self.make_family(index)
+        response, _ = self.list_users(page_size=4)
+        ids = [user['id'] for user in response.data['results']]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 4)
+        self.assertIsNotNone(response.data['next'])
+
+        seen = list(ids)
+        while response.data['next']:
+            response, _ = self.list_users(response.data['next'])
+            seen.extend(user['id'] for user in response.data['results'])
+        self.assertEqual(seen, list(User.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_parent_role_data_includes_students(self):
+        parent = self.make_family(0)
+        response, _ = self.list_users()
+        row = next(user for user in response.data['results'] if user['id'] == parent.id)
+        self.assertEqual(row['role_data']['relationship'], 'Mother')
+        self.assertEqual(
+            sorted(student['username'] for student in row['role_data']['students']),
+            ['student0_0', 'student0_1'],
+        )
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.make_family(0)
+        _, small = self.list_users(page_size=5)
+        for index in range(1, 6):
+            self.make_family(index, wards=3)
+        _, large = self.list_users(page_size=50)
+        self.assertEqual(small, large)
+
+
+class UserExportTests(AdminAPITestCase):
+
+    def export(self, **params):
+        response = self.client.get('/user/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_profile_serializer(self):
+        parent = self.make_family(0)
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(User.objects.order_by('id').values_list('id', flat=True)))
+        listing = json.loads(self.client.get('/user/', {'page_size': 100}).content)['results']
+        self.assertEqual(rows, listing)
+        parent_row = next(row for row in rows if row['id'] == parent.id)
+        # Microseconds survive, as in the rendered listing
+        self.assertEqual(
+            parent_row['role_data']['students'][0]['enrollment_date'],
+            UserProfileSerializer(parent).data['role_data']['students'][0]['enrollment_date'].isoformat().replace('+00:00', 'Z'),
+        )
+
+    def test_csv_export(self):
+        self.make_family(0)
+        rows = list(csv.DictReader(io.StringIO(self.export(output='csv'))))
+        self.assertEqual(len(rows), User.objects.count())
+        parent_row = next(row for row in rows if row['role'] == 'parent')
+        listed = next(row for row in json.loads(self.client.get('/user/').content)['results'] if row['role'] == 'parent')
+        self.assertEqual(json.loads(parent_row['role_data']), listed['role_data'])
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/user/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    @tag('slow')
+    def test_peak_memory_is_flat_as_roster_grows(self):
+        def peak_for(total):
+            User.objects.bulk_create(
+                User(username=f'bulk{n}', email=f'bulk{n}@example.com', password='!', role='guest')
+                for n in range(User.objects.count(), total)
+            )
+            response = self.client.get('/user/export/')
+            tracemalloc.start()
+            lines = sum(1 for _ in response.streaming_content)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertEqual(lines, total)
+            return peak
+
+        small = peak_for(10_000)
+        large = peak_for(100_000)
+        # Ten times the rows must not mean ten times the memory.
+        self.assertLess(large, small * 2)
+
+
+class UserImportTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = make_user('existing_student', 'student')
+        StudentProfile.objects.create(user=self.student)
+
+    def test_json_import_creates_users_profiles_and_mappings(self):
+        rows = [
+            {'username': 'new_student', 'email': 'ns@example.com', 'password': 'pw-12345', 'role': 'student', 'is_approved': True},
+            {'username': 'new_teacher', 'email': 'nt@example.com', 'password': 'pw-12345', 'role': 'teacher', 'is_approved': True},
+            {'username': 'new_parent', 'email': 'np@example.com', 'password': 'pw-12345', 'role': 'parent',
+             'is_approved': True, 'relationship': 'Father', 'student_ids': [self.student.id]},
+            {'username': 'new_guest', 'email': 'ng@example.com', 'password': 'pw-12345', 'role': 'guest'},
+        ]
+        response = self.client.post('/user/import/', rows, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 4)
+
+        parent = User.objects.get(username='new_parent')
+        self.assertTrue(parent.check_password('pw-12345'))
+        self.assertEqual(parent.parent_profile.relationship, 'Father')
+        self.assertEqual(
+            list(parent.parent_profile.student_mappings.values_list('student__user_id', flat=True)),
+            [self.student.id],
+        )
+        self.assertTrue(StudentProfile.objects.filter(user__username='new_student').exists())
+        self.assertTrue(TeacherProfile.objects.filter(user__username='new_teacher').exists())
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        rows = [
+            {'username': 'ok_user', 'email': 'ok@example.com', 'password': 'pw-12345', 'role': 'guest'},
+            {'username': 'dup', 'email': 'admin@example.com', 'password': 'pw-12345', 'role': 'guest'},
+            {'username': 'dup', 'email': 'dup2@example.com', 'password': 'pw-12345', 'role': 'guest'},
+            {'username': 'bad_parent', 'email': 'bp@example.com', 'password': 'pw-12345', 'role': 'parent',
+             'relationship': 'Mother', 'student_ids': [self.admin.id]},
+            {'username': 'bad_role', 'email': 'br@example.com', 'password': 'pw-12345', 'role': 'janitor'},
+        ]
+        count = User.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/user/import/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['errors']), [1, 2, 3, 4])
+        self.assertIn('email', response.data['errors'][1])
+        self.assertIn('username', response.data['errors'][2])
+        self.assertIn('student_ids', response.data['errors'][3])
+        self.assertIn('role', response.data['errors'][4])
+        self.assertEqual(User.objects.count(), count)
+        # Validation is set-based: a fixed number of queries regardless of row count.
+        self.assertLessEqual(len(queries), 3)
+
+    def test_csv_import(self):
+        upload = io.BytesIO(
+            b"username,email,password,role,is_approved,relationship,student_ids\n"
+            b"csv_parent,cp@example.com,pw-12345,parent,true,Guardian," + str(self.student.id).encode() + b"\n"
+            b"csv_guest,cg@example.com,pw-12345,guest,,,\n"
+        )
+        upload.name = 'users.csv'
+        response = self.client.post('/user/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        parent = User.objects.get(username='csv_parent')
+        self.assertEqual(parent.parent_profile.student_mappings.get().student.user, self.student)
+        self.assertFalse(User.objects.get(username='csv_guest').is_approved)
+
+    @override_settings(PASSWORD_HASHING_POOL='thread', PASSWORD_HASHING_POOL_SIZE=2)
+    def test_large_import_hashes_on_the_shared_pool(self):
+        rows = [
+            {'username': f'pool{n}', 'email': f'pool{n}@example.com', 'password': f'pw-{n}', 'role': 'guest'}
+            for n in range(BULK_HASH_POOL_THRESHOLD + 10)
+        ]
+        with mock.patch.dict('testapp.hashers._executors', clear=True):
+            response = self.client.post('/user/import/', rows, format='json')
+            executor = get_hashing_executor()
+        executor.shutdown()
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNotNone(executor)
+        self.assertTrue(User.objects.get(username='pool7').check_password('pw-7'))
+
+    @override_settings(PASSWORD_HASHING_POOL=None, PASSWORD_HASHING_POOL_SIZE=2)
+    def test_large_import_uses_a_process_pool_without_a_configured_one(self):
+        rows = [
+            {'username': f'proc{n}', 'email': f'proc{n}@example.com', 'password': f'pw-{n}', 'role': 'guest'}
+            for n in range(BULK_HASH_POOL_THRESHOLD)
+        ]
+        with mock.patch.dict('testapp.hashers._executors', clear=True):
+            response = self.client.post('/user/import/', rows, format='json')
+            executor = hashing_pool('process', 2)
+        executor.shutdown()
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsInstance(executor, ProcessPoolExecutor)
+        self.assertTrue(User.objects.get(username='proc7').check_password('pw-7'))
+
+
+class UserCreateEditTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.students = []
+        for n in range(4):
+            student = make_user(f'ward{n}', 'student')
+            StudentProfile.objects.create(user=student)
+            self.students.append(student)
+
+    def mapped_ids(self, parent):
+        return sorted(ParentStudentMapping.objects.filter(parent__user=parent).values_list('student__user_id', flat=True))
+
+    def test_create_parent_with_students(self):
+        ids = [student.id for student in self.students[:3]]
+        response = self.client.post('/user/create/', {
+            'username': 'mum', 'email': 'mum@example.com', 'password': 'pw-12345', 'password2': 'pw-12345',
+            'role': 'parent', 'is_approved': True, 'relationship': 'Mother', 'student_ids': ids,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.mapped_ids(User.objects.get(username='mum')), ids)
+
+    def test_invalid_student_id_is_rejected_with_one_query(self):
+        ids = [self.students[0].id, self.admin.id, self.students[1].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/user/create/', {
+                'username': 'dad', 'email': 'dad@example.com', 'password': 'pw-12345', 'password2': 'pw-12345',
+                'role': 'parent', 'is_approved': True, 'relationship': 'Father', 'student_ids': ids,
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['student_ids'], [f'Invalid student ID: {self.admin.id}'])
+        student_queries = [q for q in queries.captured_queries if 'testapp_studentprofile' in q['sql']]
+        self.assertEqual(len(student_queries), 1)
+
+    def test_edit_only_writes_changed_mappings(self):
+        parent = make_user('guardian', 'parent')
+        profile = ParentProfile.objects.create(user=parent, relationship='Guardian')
+        for student in self.students[:3]:
+            ParentStudentMapping.objects.create(parent=profile, student=student.student_profile)
+        kept = ParentStudentMapping.objects.get(parent=profile, student__user=self.students[0])
+
+        new_ids = [self.students[0].id, self.students[1].id, self.students[3].id]
+        response = self.client.put('/user/', {
+            'id': parent.id, 'role': 'parent', 'relationship': 'Guardian', 'student_ids': new_ids,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.mapped_ids(parent), sorted(new_ids))
+        # Unchanged mappings keep their rows instead of being recreated.
+        self.assertTrue(ParentStudentMapping.objects.filter(pk=kept.pk).exists())
+
+    def test_mapping_pairs_are_unique(self):
+        parent = make_user('guardian', 'parent')
+        profile = ParentProfile.objects.create(user=parent, relationship='Guardian')
+        ParentStudentMapping.objects.create(parent=profile, student=self.students[0].student_profile)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ParentStudentMapping.objects.create(parent=profile, student=self.students[0].student_profile)
+
+
+class ProfileCacheTests(AdminAPITestCase):
+
+    def get_profile(self, user):
+        # Single-user reads take the id from the request body
+        response = self.client.generic('GET', '/user/', json.dumps({'id': user.id}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cached_listing_loads_no_user_rows(self):
+        self.make_family(0)
+        self.client.get('/user/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/')
+        self.assertEqual(response.status_code, 200)
+        # Only the id page and the ETag aggregates run; no user rows are loaded
+        self.assertFalse([q for q in queries.captured_queries if '"testapp_user"."username"' in q['sql']])
+
+    def test_student_changes_refresh_parent_entry(self):
+        parent = self.make_family(0)
+        self.assertEqual(len(self.get_profile(parent)['role_data']['students']), 2)
+
+        student = User.objects.get(username='student0_0')
+        student.username = 'renamed'
+        student.save()
+        names = sorted(s['username'] for s in self.get_profile(parent)['role_data']['students'])
+        self.assertEqual(names, ['renamed', 'student0_1'])
+
+        ParentStudentMapping.objects.filter(student__user=student).delete()
+        self.assertEqual(len(self.get_profile(parent)['role_data']['students']), 1)
+
+    def test_profile_deletion_refreshes_entry(self):
+        self.make_family(0)
+        teacher = User.objects.get(username='teacher0')
+        self.assertIsNotNone(self.get_profile(teacher)['role_data'])
+        TeacherProfile.objects.filter(user=teacher).delete()
+        self.assertIsNone(self.get_profile(teacher)['role_data'])
+
+    def test_entries_refilled_before_commit_are_dropped_on_commit(self):
+        parent = self.make_family(0)
+        stale = self.get_profile(parent)
+        with self.captureOnCommitCallbacks(execute=True):
+            parent.phone_number = '555'
+            parent.save()
+            # A concurrent read that still sees the uncommitted row caches it again
+            profile_cache().set(profile_key(parent.id), stale, version=PROFILE_CACHE_VERSION)
+        self.assertEqual(self.get_profile(parent)['phone_number'], '555')
+
+    def test_missing_user_is_not_found(self):
+        response = self.client.generic('GET', '/user/', json.dumps({'id': 999999}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+SHARED_PROFILE_CACHE = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'clms-test-profiles'),
+}
+
+
+# Validators are only sent when the profile cache is shared between workers
+@override_settings(CACHES={**settings.CACHES, 'profiles': SHARED_PROFILE_CACHE})
+class ConditionalListingTests(AdminAPITestCase):
+
+    def test_unchanged_listing_returns_304_without_serializing(self):
+        self.make_family(0)
+        response = self.client.get('/user/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with mock.patch('adminapp.views.user_listing') as listing:
+            response = self.client.get('/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        listing.assert_not_called()
+
+    def test_writes_change_the_etag(self):
+        parent = self.make_family(0)
+        etags = {self.client.get('/user/')['ETag']}
+
+        student = User.objects.get(username='student0_0')
+        student.phone_number = '555'
+        student.save()
+        etags.add(self.client.get('/user/')['ETag'])
+
+        ParentStudentMapping.objects.filter(parent__user=parent, student__user=student).delete()
+        etags.add(self.client.get('/user/')['ETag'])
+
+        User.objects.filter(username='teacher0').delete()
+        etags.add(self.client.get('/user/')['ETag'])
+        self.assertEqual(len(etags), 4)
+
+    def test_process_local_profile_cache_disables_validators(self):
+        self.make_family(0)
+        etag = self.client.get('/user/')['ETag']
+        caches = dict(settings.CACHES, profiles={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})
+        with override_settings(CACHES=caches):
+            response = self.client.get('/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_etag_depends_on_the_requested_page(self):
+        self.make_family(0)
+        first = self.client.get('/user/', {'page_size': 2})
+        second = self.client.get(first.data['next'], HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+
+    def test_if_modified_since(self):
+        self.make_family(0)
+        response = self.client.get('/user/')
+        response = self.client.get('/user/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class ListingFilterTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(3):
+            self.make_family(index)
+        User.objects.filter(username='teacher2').update(is_approved=False)
+        User.objects.filter(username='parent0').update(date_joined=timezone.now() - timedelta(days=30))
+
+    def usernames(self, **params):
+        response = self.client.get('/user/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(row['username'] for row in response.data['results'])
+
+    def test_role_and_approval_filters(self):
+        self.assertEqual(self.usernames(role='teacher'), ['teacher0', 'teacher1', 'teacher2'])
+        self.assertEqual(self.usernames(role='teacher', is_approved='false'), ['teacher2'])
+
+    def test_join_date_range(self):
+        cutoff = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.usernames(joined_before=cutoff), ['parent0'])
+        self.assertNotIn('parent0', self.usernames(joined_after=cutoff))
+
+    def test_prefix_search_on_username_and_email(self):
+        self.assertEqual(self.usernames(search='student1_'), ['student1_0', 'student1_1'])
+        User.objects.filter(username='teacher1').update(email='zed@example.com')
+        self.assertEqual(self.usernames(search='zed'), ['teacher1'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/user/', {'role': 'janitor'}).status_code, 400)
+        self.assertEqual(self.client.get('/user/', {'fields': 'id,password'}).status_code, 400)
+
+    def test_projection_narrows_select_and_output(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user/', {'fields': 'username,id', 'role': 'parent'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'username'])
+        page_query = [q['sql'] for q in queries.captured_queries if '"testapp_user"."username"' in q['sql']]
+        self.assertEqual(len(page_query), 1)
+        self.assertNotIn('"testapp_user"."email"', page_query[0])
+        self.assertFalse([q for q in queries.captured_queries if 'testapp_parentstudentmapping"."parent_id' in q['sql']])
+
+    def test_projection_with_role_data(self):
+        response = self.client.get('/user/', {'fields': 'role_data,username', 'role': 'parent'})
+        row = response.data['results'][0]
+        self.assertEqual(list(row), ['username', 'role_data'])
+        self.assertEqual(len(row['role_data']['students']), 2)
+
+
+class ProfileQueryCountTests(AdminAPITestCase):
+
+    def sql(self, queries):
+        return [q['sql'] for q in queries.captured_queries]
+
+    def test_only_roles_present_are_selected(self):
+        self.make_family(0)
+        with CaptureQueriesContext(connection) as queries:
+            user_profile_rows(User.objects.filter(role='teacher'))
+        users_sql = self.sql(queries)[1]
+        self.assertIn('testapp_teacherprofile', users_sql)
+        self.assertNotIn('testapp_studentprofile', users_sql)
+        self.assertNotIn('testapp_parentprofile', users_sql)
+
+    def test_teacher_page_does_not_prefetch_mappings(self):
+        self.make_family(0)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/user/', {'role': 'teacher'})
+        self.assertFalse([sql for sql in self.sql(queries) if 'testapp_parentstudentmapping"."parent_id" IN' in sql])
+
+    def test_many_serializer_uses_profile_rows(self):
+        for index in range(3):
+            self.make_family(index, wards=index + 1)
+        users = User.objects.filter(role='parent').order_by('id')
+        with CaptureQueriesContext(connection) as queries:
+            data = UserProfileSerializer(users, many=True).data
+        self.assertEqual([len(row['role_data']['students']) for row in data], [1, 2, 3])
+        self.assertEqual(len(queries), 3)  # roles present, users, mappings
+        self.assertEqual(UserProfileSerializer(list(reversed(users)), many=True).data, data[::-1])
+
+    def test_export_query_count_does_not_grow_with_roster(self):
+        self.make_family(0)
+        with CaptureQueriesContext(connection) as small:
+            b''.join(self.client.get('/user/export/').streaming_content)
+        for index in range(1, 8):
+            self.make_family(index, wards=3)
+        with CaptureQueriesContext(connection) as large:
+            b''.join(self.client.get('/user/export/').streaming_content)
+        self.assertEqual(len(small), len(large))
+
+
+class FastProfileRowsTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(3):
+            self.make_family(index, wards=index + 1)
+        # Profile-less users exercise the `role_data: None` branch
+        make_user('orphan_student', 'student')
+        make_user('orphan_parent', 'parent')
+
+    def test_rows_match_profile_serializer(self):
+        users = User.objects.order_by('id')
+        expected = [UserProfileSerializer(user).data for user in users]
+        self.assertEqual(user_profile_rows(users), [dict(row) for row in expected])
+
+    def test_rendered_bytes_match_drf_renderer(self):
+        users = User.objects.order_by('id')
+        expected = JSONRenderer().render([UserProfileSerializer(user).data for user in users])
+        self.assertEqual(FastJSONRenderer().render(user_profile_rows(users)), expected)
+
+    def test_rows_use_two_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            user_profile_rows(User.objects.all())
+        self.assertEqual(len(queries), 3)  # roles present, users, mappings
+        with CaptureQueriesContext(connection) as queries:
+            user_profile_rows(User.objects.all(), roles={'student', 'teacher', 'parent', 'admin'})
+        self.assertEqual(len(queries), 2)
+
+
+class RequestMetricsTests(AdminAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset_metrics()
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.make_family(0)
+        self.client.get('/user/')
+        self.client.get('/user/')
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('clms_request_duration_seconds_count{view="list_users"} 2', body)
+        self.assertIn('clms_request_queries_bucket{view="list_users",le="+Inf"} 2', body)
+        self.assertIn('# TYPE clms_request_query_duration_seconds histogram', body)
+
+    @override_settings(DEBUG=True, SLOW_QUERY_LOG=False)
+    async def test_async_requests_are_not_adapted(self):
+        # Django only logs middleware adaptation with DEBUG on
+        with mock.patch.object(logging.getLogger('django.request'), 'debug') as debug:
+            response = await AsyncClient().post(
+                '/async/login/', {'username': 'admin', 'password': 'wrong'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 400)
+        adapted = [call for call in debug.call_args_list if 'RequestMetricsMiddleware' in str(call.args)]
+        self.assertEqual(adapted, [])
+        body = metrics.render_metrics()
+        self.assertIn('clms_request_duration_seconds_count{view="login_user_async"} 1', body)
+        self.assertNotIn('clms_request_queries_sum{view="login_user_async"} 0', body)
+
+    def test_query_count_buckets_are_cumulative(self):
+        recorder = metrics.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            User.objects.count()
+            User.objects.count()
+        metrics.request_queries.observe('probe', recorder.count)
+        body = metrics.render_metrics()
+        self.assertIn('clms_request_queries_bucket{view="probe",le="1"} 0', body)
+        self.assertIn('clms_request_queries_bucket{view="probe",le="2"} 1', body)
+        self.assertIn('clms_request_queries_sum{view="probe"} 2', body)
+
+    def test_metrics_are_admin_only(self):
+        self.client.force_authenticate(make_user('teacher', 'teacher'))
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def test_slow_queries_are_logged_with_their_origin(self):
+        with self.assertLogs('clms.queries', 'WARNING') as logs:
+            with connection.execute_wrapper(metrics.QueryRecorder(log_slow=True, slow_threshold=0)):
+                User.objects.count()
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('adminapp/tests.py', logs.output[0])
+
+    def test_repeated_queries_are_logged_once(self):
+        recorder = metrics.QueryRecorder(log_slow=True, slow_threshold=10, repeat_threshold=3)
+        with self.assertLogs('clms.queries', 'WARNING') as logs:
+            with connection.execute_wrapper(recorder):
+                for user_id in range(5):
+                    User.objects.filter(id=user_id).exists()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('repeated 3 times from adminapp/tests.py', logs.output[0])
+
+
+class OutboxTests(AdminAPITestCase):
+
+    def create_teacher(self, username, approved=False):
+        return self.client.post('/user/create/', {
+            'username': username, 'email': f'{username}@example.com', 'password': 'pw-12345',
+            'password2': 'pw-12345', 'role': 'teacher', 'is_approved': approved,
+        }, format='json')
+
+    def test_create_queues_welcome_mail_without_sending(self):
+        response = self.create_teacher('newbie')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.get().kind, 'welcome')
+
+        self.assertEqual(send_outbox_batch(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['newbie@example.com'])
+        self.assertEqual(OutboxMessage.objects.get().status, 'sent')
+
+    def test_approval_flip_queues_one_mail(self):
+        user = make_user('waiting', 'teacher', is_approved=False)
+        self.client.put('/user/', {'id': user.id, 'is_approved': True}, format='json')
+        self.client.put('/user/', {'id': user.id, 'is_approved': True}, format='json')
+        self.assertEqual(list(OutboxMessage.objects.values_list('kind', 'recipient')), [('approval', 'waiting@example.com')])
+
+    def test_batch_reuses_one_connection(self):
+        for n in range(5):
+            self.create_teacher(f'teacher{n}')
+        with mock.patch('adminapp.mail.get_connection', wraps=get_connection) as opened:
+            self.assertEqual(send_outbox_batch(batch_size=3), (3, 0))
+            self.assertEqual(send_outbox_batch(batch_size=3), (2, 0))
+        self.assertEqual(opened.call_count, 2)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failures_back_off_then_give_up(self):
+        self.create_teacher('unlucky')
+        with override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_BACKOFF=60), \
+                mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(send_outbox_batch(), (0, 1))
+            message = OutboxMessage.objects.get()
+            self.assertEqual((message.status, message.attempts, message.last_error), ('pending', 1, 'down'))
+            self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=55))
+            # Not due yet
+            self.assertEqual(send_outbox_batch(), (0, 0))
+
+            OutboxMessage.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(send_outbox_batch(), (0, 1))
+        self.assertEqual(OutboxMessage.objects.get().status, 'failed')
+
+    def test_worker_writes_to_file_backend(self):
+        self.create_teacher('filed')
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.filebased.EmailBackend', EMAIL_FILE_PATH=directory,
+        ):
+            call_command('send_outbox', '--once', stdout=io.StringIO())
+            contents = ''.join(open(os.path.join(directory, name)).read() for name in os.listdir(directory))
+        self.assertIn('To: filed@example.com', contents)
+        self.assertIn('Welcome to CLMS', contents)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkApprovalTests(AdminAPITestCase):
+
+    def approve(self, payload):
+        return self.client.post('/user/approve/', payload, format='json')
+
+    def test_approves_ids_and_reports_failures(self):
+        pending = [make_user(f'pending{n}', role, is_approved=False)
+                   for n, role in enumerate(['student', 'teacher', 'parent', 'guest'])]
+        StudentProfile.objects.create(user=pending[0])
+        done = make_user('done', 'teacher')
+        # Cached before approval, so the response must not be served stale afterwards
+        get_user_profiles([pending[1].id])
+
+        response = self.approve({'ids': [user.id for user in pending] + [done.id, 999999]})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['approved'], 4)
+        self.assertEqual(response.data['profiles_created'], 2)
+        self.assertEqual(response.data['failed'], [
+            {'id': done.id, 'error': 'User is already approved.'},
+            {'id': 999999, 'error': 'User not found.'},
+        ])
+        self.assertEqual(User.objects.filter(is_approved=False).count(), 0)
+        self.assertTrue(TeacherProfile.objects.filter(user=pending[1]).exists())
+        self.assertTrue(ParentProfile.objects.filter(user=pending[2]).exists())
+        self.assertEqual(OutboxMessage.objects.filter(kind='approval').count(), 4)
+        self.assertTrue(get_user_profiles([pending[1].id])[0]['is_approved'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def run(prefix, count):
+            users = [make_user(f'{prefix}{n}', 'student', is_approved=False) for n in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                self.approve({'ids': [user.id for user in users]})
+            return len(queries)
+
+        self.assertEqual(run('small', 2), run('large', 20))
+
+    def test_filter_approves_matching_pending_users(self):
+        make_user('waiting_teacher', 'teacher', is_approved=False)
+        make_user('waiting_student', 'student', is_approved=False)
+        response = self.approve({'role': 'teacher'})
+        self.assertEqual((response.data['approved'], response.data['failed']), (1, []))
+        self.assertFalse(User.objects.get(username='waiting_student').is_approved)
+
+    def test_rejects_empty_or_mixed_selection_and_non_admins(self):
+        self.assertEqual(self.approve({}).status_code, 400)
+        self.assertEqual(self.approve({'ids': [1], 'role': 'student'}).status_code, 400)
+        self.client.force_authenticate(make_user('teacher', 'teacher'))
+        self.assertEqual(self.approve({'ids': [1]}).status_code, 403)
+
+
+class RelationshipGraphTests(AdminAPITestCase):
+
+    def graph(self, url, ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'ids': ','.join(str(user_id) for user_id in ids)})
+        return response, len(queries)
+
+    def test_students_of_parents_in_one_query(self):
+        parents = [self.make_family(index, wards=index + 1) for index in range(3)]
+        lonely = make_user('lonely', 'parent')
+        response, queries = self.graph('/user/students/', [parent.id for parent in parents] + [lonely.id])
+        self.assertEqual(response.status_code, 200)
+        graph = response.data['students']
+        self.assertEqual([len(graph[parent.id]) for parent in parents], [1, 2, 3])
+        self.assertEqual(graph[lonely.id], [])
+        student = graph[parents[0].id][0]
+        self.assertEqual(student['username'], 'student0_0')
+        self.assertEqual(set(student), {'id', 'username', 'email', 'enrollment_date'})
+
+        _, more_queries = self.graph('/user/students/', [parents[0].id])
+        self.assertEqual(queries, more_queries)
+
+    def test_parents_of_students(self):
+        first = self.make_family(0)
+        second_profile = ParentProfile.objects.create(user=make_user('father', 'parent'), relationship='Father')
+        shared = User.objects.get(username='student0_0')
+        ParentStudentMapping.objects.create(parent=second_profile, student=shared.student_profile)
+
+        response, _ = self.graph('/user/parents/', [shared.id])
+        self.assertEqual(
+            [(parent['id'], parent['relationship']) for parent in response.data['parents'][shared.id]],
+            [(first.id, 'Mother'), (second_profile.user_id, 'Father')],
+        )
+
+    def test_non_admins_only_see_their_own_family(self):
+        parent = self.make_family(0)
+        other = self.make_family(1)
+        self.client.force_authenticate(parent)
+        self.assertEqual(len(self.graph('/user/students/', [parent.id])[0].data['students'][parent.id]), 2)
+        self.assertEqual(self.graph('/user/students/', [other.id])[0].status_code, 403)
+        self.assertEqual(self.graph('/user/parents/', [parent.id])[0].status_code, 403)
+
+        student = User.objects.get(username='student0_1')
+        self.client.force_authenticate(student)
+        self.assertEqual(self.graph('/user/parents/', [student.id])[0].data['parents'][student.id][0]['id'], parent.id)
+
+    def test_rejects_bad_ids(self):
+        self.assertEqual(self.client.get('/user/parents/', {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.client.get('/user/parents/').status_code, 400)
+        with override_settings(RELATIONSHIP_MAX_IDS=2):
+            self.assertEqual(self.client.get('/user/parents/', {'ids': '1,2,3'}).status_code, 400)
+
+
+class ProfileImageBackfillTests(AdminAPITestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        image = io.BytesIO()
+        Image.new('RGB', (300, 300), 'grey').save(image, 'JPEG')
+        default_storage.save('default/default_profile.jpg', ContentFile(image.getvalue()))
+        super().setUp()
+
+    def test_bulk_created_users_are_backfilled_and_listed_with_thumbnails(self):
+        User.objects.bulk_create(
+            User(username=f'bulk{n}', email=f'bulk{n}@example.com', password='!', role='student') for n in range(3)
+        )
+        listed = self.client.get('/user/', {'role': 'student'}).data['results']
+        self.assertEqual(listed[0]['avatar']['small'], '/media/default/default_profile.jpg')
+
+        call_command('process_profile_images', stdout=io.StringIO())
+        avatars = [row['avatar'] for row in self.client.get('/user/', {'role': 'student'}).data['results']]
+        self.assertEqual(len({avatar['small'] for avatar in avatars}), 1)
+        self.assertRegex(avatars[0]['small'], r'^/media/thumbnails/[0-9a-f]{2}/[0-9a-f]{64}-64\.jpg$')
+        self.assertTrue(default_storage.exists(avatars[0]['small'].removeprefix('/media/')))
+
+    def test_projection_of_avatar_uses_profile_path(self):
+        response = self.client.get('/user/', {'fields': 'id,avatar'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'avatar'})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedCommandTests(AdminAPITestCase):
+
+    def seed(self, *args):
+        call_command('seed_lms', '--users', '200', '--batch-size', '64', *args, stdout=io.StringIO())
+        return list(User.objects.filter(username__startswith='seed_').order_by('username')
+                    .values_list('username', 'role', 'is_approved', 'phone_number', 'date_joined'))
+
+    def test_seeds_exact_distribution_with_profiles_and_mappings(self):
+        self.seed('--distribution', 'student=50,parent=25,teacher=25', '--children', '2-2')
+        users = User.objects.filter(username__startswith='seed_')
+        self.assertEqual(users.filter(role='student').count(), 100)
+        self.assertEqual(users.filter(role='parent').count(), 50)
+        self.assertEqual(StudentProfile.objects.count(), 100)
+        self.assertEqual(TeacherProfile.objects.count(), 50)
+        self.assertEqual(ParentStudentMapping.objects.count(), 100)
+        self.assertTrue(users.first().check_password('password123'))
+
+    def test_same_seed_gives_same_data_and_clear_replaces_it(self):
+        first = self.seed()
+        self.assertEqual(self.seed('--clear'), first)
+        self.assertNotEqual(self.seed('--clear', '--seed', '1'), first)
+        self.assertEqual(User.objects.filter(username__startswith='seed_').count(), 200)
+
+    def test_clear_cascades_and_leaves_other_users(self):
+        self.make_family(0)
+        self.seed()
+        cached = list(User.objects.filter(username__startswith='seed_').values_list('id', flat=True)[:5])
+        self.assertEqual(len(get_user_profiles(cached)), 5)
+        self.seed('--clear', '--users', '0')
+        self.assertEqual(get_user_profiles(cached), [])
+        self.assertFalse(User.objects.filter(username__startswith='seed_').exists())
+        self.assertEqual(StudentProfile.objects.count(), 2)
+        self.assertEqual(ParentStudentMapping.objects.count(), 2)
+        # Receivers are back once the purge is over
+        self.assertTrue(post_delete.has_listeners(User))
+
+    def test_refuses_to_mix_with_existing_users(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
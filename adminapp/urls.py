@@ -3,5 +3,11 @@ from .import views
 
 urlpatterns = [
     path('user/create/', views.create_user, name='create_user'),
+    path('user/import/', views.import_users, name='import_users'),  # Bulk create users from a CSV file or JSON array
+    path('user/approve/', views.approve_users, name='approve_users'),  # Approve pending users by id list or filter
+    path('user/parents/', views.student_parents, name='student_parents'),  # ?ids=<student ids>: parents of each
+    path('user/students/', views.parent_students, name='parent_students'),  # ?ids=<parent ids>: students of each
     path('user/', views.user_management, name='list_users'),  # List all users, single function for both functionality    
+    path('user/export/', views.export_users, name='export_users'),  # Stream the full roster as NDJSON or CSV
+    path('metrics/', views.metrics, name='metrics'),  # Prometheus text format, admin only
 ]
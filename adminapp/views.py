@@ -1,10 +1,28 @@
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
 from testapp.serializers import UserRegistrationSerializer
-from .serializers import AdminUserCreationSerializer, AdminUserEditSerializer, UserProfileSerializer
-from testapp.models import User
+from .serializers import (
+    AdminUserCreationSerializer, AdminUserEditSerializer, BulkApprovalSerializer, RelationshipQuerySerializer,
+    UserListingQuerySerializer, UserProfileSerializer, create_missing_profiles, user_profile_rows,
+)
+from .pagination import UserCursorPagination
+from .cache import get_user_profiles, invalidate_user_profiles, listing_validators_enabled, user_listing_validators
+from .mail import queue_approval_emails, queue_welcome_email
+from .metrics import render_metrics
+from testapp.authentication import invalidate_user_snapshot
+from testapp.models import User, ParentStudentMapping
 from django.views.decorators.csrf import csrf_exempt
 
 
@@ -19,54 +37,340 @@ def create_user(request):
 
     serializer = AdminUserCreationSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        user = serializer.save()
+        with transaction.atomic():
+            user = serializer.save()
+            queue_welcome_email(user)
         return Response({"message": f"{user.role.capitalize()} created successfully!"}, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def parse_import_rows(request):
+    """
+    Read import rows from an uploaded CSV `file` or a JSON array body.
+    CSV `student_ids` cells hold IDs separated by semicolons.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return request.data
+
+    rows = []
+    for record in csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig')):
+        row = {field: value for field, value in record.items() if value not in (None, '')}
+        if 'student_ids' in row:
+            row['student_ids'] = [value.strip() for value in row['student_ids'].split(';') if value.strip()]
+        rows.append(row)
+    return rows
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_users(request):
+    """
+    Admin-only bulk version of `create_user`. Every row is validated before
+    anything is written; if any row fails, nothing is created and the errors
+    are returned keyed by row index.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "You do not have permission to create users."}, status=status.HTTP_403_FORBIDDEN)
+
+    rows = parse_import_rows(request)
+    if isinstance(rows, list):
+        for row in rows:
+            # Imports only carry the password once.
+            if isinstance(row, dict) and 'password2' not in row and 'password' in row:
+                row['password2'] = row['password']
+
+    serializer = AdminUserCreationSerializer(data=rows, many=True, context={'request': request})
+    if serializer.is_valid():
+        users = serializer.save()
+        return Response({"message": f"{len(users)} users imported successfully!", "created": len(users)},
+                        status=status.HTTP_201_CREATED)
+
+    return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def approve_users(request):
+    """
+    Admin-only bulk approval. Takes `ids`, or the listing filters (`role`,
+    `joined_after`, `joined_before`, `search`) to approve every matching
+    pending user. One transaction flips `is_approved` with a single UPDATE,
+    adds missing role profiles and queues the approval emails; ids that do
+    not exist or are already approved come back in `failed`.
+    `profiles_created` counts the profiles that were missing when checked,
+    so it can include one that a concurrent edit created first.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "You do not have permission to approve users."}, status=status.HTTP_403_FORBIDDEN)
+
+    selection = BulkApprovalSerializer(data=request.data)
+    if not selection.is_valid():
+        return Response(selection.errors, status=status.HTTP_400_BAD_REQUEST)
+    requested = selection.validated_data.get('ids')
+
+    with transaction.atomic():
+        if requested:
+            users = User.objects.filter(id__in=requested)
+        else:
+            users = selection.filter_queryset(User.objects.filter(is_approved=False))
+        rows = list(users.select_for_update().values_list('id', 'role', 'is_approved', 'username', 'email'))
+        pending = [row for row in rows if not row[2]]
+        pending_ids = [row[0] for row in pending]
+        approved = 0
+        if pending_ids:
+            # update() skips auto_now and the save signals, so both are handled here
+            approved = User.objects.filter(id__in=pending_ids).update(is_approved=True, modified=timezone.now())
+        profiles_created = create_missing_profiles([(row[0], row[1]) for row in pending])
+        queue_approval_emails([(row[3], row[4]) for row in pending])
+
+    invalidate_user_profiles(pending_ids)
+    for user_id in pending_ids:
+        invalidate_user_snapshot(user_id)
+
+    failed = []
+    if requested:
+        found = {row[0]: row for row in rows}
+        for user_id in dict.fromkeys(requested):
+            if user_id not in found:
+                failed.append({"id": user_id, "error": "User not found."})
+            elif found[user_id][2]:
+                failed.append({"id": user_id, "error": "User is already approved."})
+
+    return Response({
+        "message": f"{approved} users approved.",
+        "approved": approved,
+        "profiles_created": profiles_created,
+        "failed": failed,
+    }, status=status.HTTP_200_OK)
+
+
+# Edge columns for each direction: (requested side, related side, related fields)
+RELATIONSHIP_EDGES = {
+    'parents': ('student__user_id', 'parent__user_id', {
+        'username': 'parent__user__username',
+        'email': 'parent__user__email',
+        'relationship': 'parent__relationship',
+    }),
+    'students': ('parent__user_id', 'student__user_id', {
+        'username': 'student__user__username',
+        'email': 'student__user__email',
+        'enrollment_date': 'student__enrollment_date',
+    }),
+}
+
+
+def relationship_graph(request, direction, own_role):
+    """
+    Adjacency lists for `ids`: every requested id maps to its related users,
+    all resolved from `ParentStudentMapping` in one join query. Admins may ask
+    about anyone, `own_role` users only about themselves.
+    """
+    query = RelationshipQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    ids = query.validated_data['ids']
+    if request.user.role != 'admin' and not (request.user.role == own_role and ids == [request.user.id]):
+        return Response({"error": "You do not have permission to access this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    source, target, columns = RELATIONSHIP_EDGES[direction]
+    edges = ParentStudentMapping.objects.filter(**{f'{source}__in': ids}).order_by('id').values(
+        source, target, *columns.values()
+    )
+    graph = {user_id: [] for user_id in ids}
+    for edge in edges:
+        graph[edge[source]].append(
+            {'id': edge[target], **{name: edge[column] for name, column in columns.items()}}
+        )
+    return Response({direction: graph}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def student_parents(request):
+    """Parents of each student in `ids` (student user ids), keyed by student id."""
+    return relationship_graph(request, 'parents', own_role='student')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def parent_students(request):
+    """Students of each parent in `ids` (parent user ids), keyed by parent id."""
+    return relationship_graph(request, 'students', own_role='parent')
+
+
 # # View users or single user
 @api_view(['GET','PUT'])
 @permission_classes([IsAuthenticated])  # Ensure only authenticated users
 def user_management(request):
     """
     Admin-only endpoint to list all users or view a single user's details.
+    Listings are cursor-paginated on `id`; pass `page_size` and follow the
+    `next`/`previous` links to walk the table. Filter with `role`,
+    `is_approved`, `joined_after`, `joined_before` and `search` (username or
+    email prefix), and narrow the output with `fields=id,username,...`.
     """
     # Ensure only admins can access this functionality
     if request.user.role != 'admin':
         return Response({"error": "You do not have permission to access this resource."}, status=status.HTTP_403_FORBIDDEN)
 
-    # If `user_id` is provided, fetch details of a single user
+    # Polling clients revalidate with If-None-Match / If-Modified-Since and get
+    # a 304 without any serialization when nothing changed.
+    if request.method == 'GET' and not listing_validators_enabled():
+        return user_listing(request)
+    if request.method == 'GET':
+        etag, last_modified = user_listing_validators(request)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified and int(last_modified.timestamp())
+        )
+        response = not_modified if not_modified is not None else user_listing(request)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    # If `user_id` is provided, update a single user
+    user_id = request.data.get('id', None)
+    if user_id is None:
+        return user_listing(request)
+
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = AdminUserEditSerializer(user, data=request.data, partial=True)
+    if serializer.is_valid():
+        updated_user = serializer.save()
+        return Response({
+            "message": "User updated successfully!",
+            "user": AdminUserEditSerializer(updated_user).data
+        }, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def user_listing(request):
+    """
+    GET side of `user_management`: a single user's profile when `id` is in the
+    body, otherwise a cursor-paginated page of profiles narrowed by the
+    `UserListingQuerySerializer` query parameters.
+    """
+    query = UserListingQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    fields = query.validated_data.get('fields')
+
     user_id = request.data.get('id', None)
     if user_id is not None:
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        profiles = get_user_profiles([user_id])
+        if not profiles:
             return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-        
-        # # For updating user data
-        if request.method == 'PUT':
-            serializer = AdminUserEditSerializer(user, data=request.data, partial=True)
-            if serializer.is_valid():
-                updated_user = serializer.save()
-                return Response({
-                    "message": "User updated successfully!",
-                    "user": AdminUserEditSerializer(updated_user).data
-                }, status=status.HTTP_200_OK)
-
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
+        return Response(project(profiles, fields)[0], status=status.HTTP_200_OK)
+
+    users = query.filter_queryset(User.objects.all())
+
     is_approved = request.data.get('is_approved', None)
     if is_approved is not None:  # Filter by `is_approved`
-        users = User.objects.filter(is_approved=is_approved)
-        serializer = UserProfileSerializer(users, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    # Otherwise, list all users
-    users = User.objects.all()
-    serializer = UserProfileSerializer(users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+        users = users.filter(is_approved=is_approved)
+
+    paginator = UserCursorPagination()
+    if fields and not set(fields) & set(UserProfileSerializer.COMPUTED_FIELDS):
+        # Plain columns only: select just those and skip profiles entirely
+        page = paginator.paginate_queryset(users.values('id', *fields), request)
+        return paginator.get_paginated_response(project(page, fields))
+
+    # Page through ids and roles only; the profiles themselves come from the cache
+    page = paginator.paginate_queryset(users.values('id', 'role'), request)
+    profiles = get_user_profiles([row['id'] for row in page], roles={row['role'] for row in page})
+    return paginator.get_paginated_response(project(profiles, fields))
+
+
+def project(rows, fields):
+    """Narrow each row to `fields` (all fields when None)."""
+    if not fields:
+        return rows
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+class Echo:
+    """
+    File-like object whose write() hands the value straight back, so csv.writer
+    can format one row at a time for a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+EXPORT_FIELDS = ['id', 'username', 'email', 'role', 'is_approved', 'phone_number', 'role_data']
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iter_user_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield `UserProfileSerializer` output for every user, walking the table in
+    id-ordered chunks so only one chunk (plus its profiles) is held in memory.
+    """
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', 'role')[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        rows = user_profile_rows(
+            User.objects.filter(id__in=[user_id for user_id, _ in chunk]).order_by('id'),
+            roles={role for _, role in chunk},
+        )
+        yield from rows
+
+
+# # Export all users
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_users(request):
+    """
+    Admin-only endpoint that streams the full user roster as NDJSON
+    (default) or CSV (`?output=csv`), with the same `role_data` as the listing.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "You do not have permission to access this resource."}, status=status.HTTP_403_FORBIDDEN)
+
+    export_format = request.query_params.get('output', 'ndjson')
+    rows = iter_user_rows(User.objects.all())
+
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield writer.writerow(EXPORT_FIELDS)
+            for row in rows:
+                row['role_data'] = json.dumps(row['role_data'], cls=JSONEncoder)
+                yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="users.csv"'
+        return response
+
+    if export_format != 'ndjson':
+        return Response({"error": "Unsupported export format."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # DRF's encoder, as the listing renders with: full microsecond datetimes
+    stream = (json.dumps(row, cls=JSONEncoder) + '\n' for row in rows)
+    response = StreamingHttpResponse(stream, content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="users.ndjson"'
+    return response
+
+
+# # Request metrics
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def metrics(request):
+    """
+    Admin-only endpoint exposing per-view latency, query count and SQL time
+    histograms in the Prometheus text format.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "You do not have permission to access this resource."}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
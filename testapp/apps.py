@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
 
 
 class TestappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'testapp'
+
+    def ready(self):
+        from .db import tune_sqlite
+        connection_created.connect(tune_sqlite, dispatch_uid='testapp.tune_sqlite')
+
+        from .images import profile_image_changed
+        post_save.connect(profile_image_changed, sender=self.get_model('User'), dispatch_uid='testapp.profile_image_changed')
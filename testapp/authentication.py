@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+
+class UserSnapshot:
+    """
+    Read-only stand-in for `User` holding just the fields the API views check
+    on `request.user`. It is never saved back to the database.
+    """
+    FIELDS = ('id', 'username', 'role', 'is_active', 'is_approved')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, role, is_active, is_approved):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+        self.is_approved = is_approved
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.username
+
+
+class SnapshotCache:
+    """
+    Small thread-safe LRU cache whose entries expire after `ttl` seconds.
+    It is local to the process, so `ttl` also bounds how long another worker
+    can keep serving a snapshot after it was invalidated here.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_snapshots = SnapshotCache(
+    max_size=getattr(settings, 'USER_SNAPSHOT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'USER_SNAPSHOT_CACHE_TTL', 60),
+)
+
+
+def invalidate_user_snapshot(user_id):
+    """Drop the cached snapshot for `user_id` after its role or approval changed."""
+    user_snapshots.delete(str(user_id))
+
+
+class SnapshotJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the token's user id to a cached
+    `UserSnapshot` instead of loading the full `User` row on every request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # Token claims carry the id as a string; key the cache the same way everywhere
+        user_id = str(user_id)
+        snapshot = user_snapshots.get(user_id)
+        if snapshot is None:
+            row = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*UserSnapshot.FIELDS).first()
+            if row is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            snapshot = UserSnapshot(*row)
+            user_snapshots.set(user_id, snapshot)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not snapshot.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return snapshot
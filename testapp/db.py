@@ -0,0 +1,15 @@
+from django.conf import settings
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    """
+    `connection_created` receiver that applies `SQLITE_PRAGMAS` to new SQLite
+    connections: WAL lets readers run alongside the single writer, and
+    busy_timeout makes writers wait for the lock instead of failing at once.
+    WAL is a persistent property of the database file, not the connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
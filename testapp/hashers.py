@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, make_password
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor taken from `PASSWORD_PBKDF2_ITERATIONS`, so it
+    can be calibrated to a target latency (see the `bench_hashers` command).
+    Hashes made with another iteration count are upgraded on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 with its cost parameters taken from `PASSWORD_ARGON2_PARAMS`.
+    Requires the optional argon2-cffi package.
+    """
+
+    def _param(self, name):
+        return getattr(settings, 'PASSWORD_ARGON2_PARAMS', {}).get(name, getattr(Argon2PasswordHasher, name))
+
+    @property
+    def time_cost(self):
+        return self._param('time_cost')
+
+    @property
+    def memory_cost(self):
+        return self._param('memory_cost')
+
+    @property
+    def parallelism(self):
+        return self._param('parallelism')
+
+
+_executors = {}  # (kind, size) -> executor
+_executor_lock = threading.Lock()
+
+
+def hashing_pool(kind, size=None):
+    """
+    The process-wide 'thread' or 'process' pool of `size` workers, started on
+    first use and reused by every later caller asking for the same pool.
+    """
+    with _executor_lock:
+        executor = _executors.get((kind, size))
+        if executor is None:
+            if kind == 'process':
+                executor = ProcessPoolExecutor(max_workers=size, initializer=django.setup)
+            else:
+                executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='password-hash')
+            _executors[kind, size] = executor
+    return executor
+
+
+def get_hashing_executor():
+    """
+    Return the bounded pool configured by `PASSWORD_HASHING_POOL` ('thread' or
+    'process', sized by `PASSWORD_HASHING_POOL_SIZE`), or None to hash inline.
+    """
+    kind = getattr(settings, 'PASSWORD_HASHING_POOL', None)
+    if not kind:
+        return None
+    return hashing_pool(kind, getattr(settings, 'PASSWORD_HASHING_POOL_SIZE', None))
+
+
+def hash_password(password):
+    """
+    `make_password` that runs on the hashing pool when one is configured, so at
+    most `PASSWORD_HASHING_POOL_SIZE` hashes compete for CPU at a time.
+    """
+    executor = get_hashing_executor()
+    if executor is None:
+        return make_password(password)
+    return executor.submit(make_password, password).result()
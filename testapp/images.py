@@ -0,0 +1,134 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('clms.images')
+
+ORIGINALS_DIR = 'profile_images'
+THUMBNAILS_DIR = 'thumbnails'
+
+_executor = None
+
+
+def thumbnail_sizes():
+    return getattr(settings, 'PROFILE_THUMBNAIL_SIZES', {'small': 64, 'medium': 256})
+
+
+def store_original(data, extension):
+    """
+    Save image bytes under a name derived from their SHA-256, so identical
+    uploads share one file and a name never points at different content.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{ORIGINALS_DIR}/{digest[:2]}/{digest}{extension.lower()}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return digest, name
+
+
+def make_thumbnail(data, size):
+    """Centre-crop `data` to a `size` pixel square, encoded as JPEG."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, 'JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+def render_profile_image(image_name):
+    """
+    Copy the image to its content-hash name and render the configured
+    thumbnails next to it, each also named after the source hash, so shared
+    images (including the default) get one set. Returns the new image name
+    and the `profile_thumbnails` value describing it.
+    """
+    with default_storage.open(image_name, 'rb') as source:
+        data = source.read()
+    digest, name = store_original(data, os.path.splitext(image_name)[1] or '.jpg')
+
+    thumbnails = {'source': name}
+    for label, size in thumbnail_sizes().items():
+        thumbnail_name = f'{THUMBNAILS_DIR}/{digest[:2]}/{digest}-{size}.jpg'
+        if not default_storage.exists(thumbnail_name):
+            default_storage.save(thumbnail_name, ContentFile(make_thumbnail(data, size)))
+        thumbnails[label] = thumbnail_name
+    return name, thumbnails
+
+
+def discard_upload(uploaded, name):
+    """Delete an upload that was copied to `name` once no user refers to it (never the default image)."""
+    from .models import User
+
+    if uploaded != name and uploaded.startswith(f'{ORIGINALS_DIR}/') and not User.objects.filter(profile_image=uploaded).exists():
+        default_storage.delete(uploaded)
+
+
+def process_profile_image(user_id):
+    from .models import User
+
+    user = User.objects.filter(id=user_id).only('id', 'profile_image', 'profile_thumbnails').first()
+    if user is None or not user.profile_image:
+        return
+    uploaded = user.profile_image.name
+    user.profile_image.name, user.profile_thumbnails = render_profile_image(uploaded)
+    # save() rather than update() so the profile cache and snapshots are invalidated
+    user.save(update_fields=['profile_image', 'profile_thumbnails', 'modified'])
+    discard_upload(uploaded, user.profile_image.name)
+
+
+def run_in_background(user_id):
+    try:
+        process_profile_image(user_id)
+    except Exception:
+        logger.exception("Processing the profile image of user %s failed", user_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_profile_image(user_id):
+    """
+    Process the image once the current transaction commits: on a small
+    thread pool by default, or inline with PROFILE_IMAGE_PROCESSING = 'inline'.
+    """
+    global _executor
+    if getattr(settings, 'PROFILE_IMAGE_PROCESSING', 'thread') == 'inline':
+        transaction.on_commit(partial(process_profile_image, user_id))
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PROFILE_IMAGE_WORKERS', 2), thread_name_prefix='profile-images',
+        )
+    transaction.on_commit(partial(_executor.submit, run_in_background, user_id))
+
+
+def profile_image_changed(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver: queue images whose thumbnails were not made from the current file."""
+    if update_fields is not None and 'profile_image' not in update_fields:
+        return
+    if instance.profile_image and (instance.profile_thumbnails or {}).get('source') != instance.profile_image.name:
+        schedule_profile_image(instance.id)
+
+
+def avatar_urls(image_name, thumbnails):
+    """
+    URLs of the original image and each thumbnail size. Sizes that have not
+    been rendered yet (or are stale) fall back to the original.
+    """
+    if not image_name:
+        return None
+    original = default_storage.url(image_name)
+    ready = thumbnails if thumbnails and thumbnails.get('source') == image_name else {}
+    urls = {'original': original}
+    for label in thumbnail_sizes():
+        urls[label] = default_storage.url(ready[label]) if label in ready else original
+    return urls
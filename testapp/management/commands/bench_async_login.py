@@ -0,0 +1,76 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from testapp.models import User
+
+
+class Command(BaseCommand):
+    """
+    Load test comparing concurrent login latency of /login/ (DRF, sync) and
+    /async/login/ against a running server. Start the server separately, e.g.
+
+        CLMS_THROTTLING=0 uvicorn CLMS.asgi:application --workers 1
+        CLMS_THROTTLING=0 gunicorn CLMS.wsgi:application --workers 1 --threads 8
+
+    Every request logs in one account from one address, so the server must
+    run with throttling off; throttled requests are reported, not timed.
+    The benchmark user is created in the configured database and removed afterwards.
+    """
+    help = "Compare concurrent login latency of the sync and async login endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--paths', nargs='+', default=['/login/', '/async/login/'])
+
+    def login(self, url, body):
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status_code = response.status
+        except urllib.error.HTTPError as exc:
+            status_code = exc.code
+        except urllib.error.URLError:
+            status_code = None
+        return time.perf_counter() - start, status_code
+
+    def handle(self, *args, **options):
+        credentials = {'username': 'bench_async_login', 'password': 'bench-pass-123'}
+        User.objects.filter(username=credentials['username']).delete()
+        User.objects.create_user(email='bench_async_login@example.com', role='student', is_approved=True, **credentials)
+        body = json.dumps(credentials).encode()
+
+        try:
+            for path in options['paths']:
+                url = options['url'].rstrip('/') + path
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                    start = time.perf_counter()
+                    results = list(executor.map(lambda _: self.login(url, body), range(options['requests'])))
+                    wall = time.perf_counter() - start
+                latencies = sorted(latency for latency, status_code in results if status_code == 200)
+                throttled = sum(1 for _, status_code in results if status_code == 429)
+                failures = len(results) - len(latencies)
+                if throttled:
+                    self.stderr.write(f"{path}: {throttled} requests were throttled; "
+                                      f"restart the server with CLMS_THROTTLING=0 for meaningful numbers")
+                if not latencies:
+                    self.stdout.write(f"{path}: all {failures} requests failed")
+                    continue
+
+                def pct(p):
+                    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3
+
+                self.stdout.write(
+                    f"{path}: {len(latencies) / wall:.1f} logins/s, p50 {pct(0.5):.0f} ms, "
+                    f"p95 {pct(0.95):.0f} ms, p99 {pct(0.99):.0f} ms, {failures} failures"
+                )
+        finally:
+            User.objects.filter(username=credentials['username']).delete()
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from testapp.models import User
+from testapp.throttling import throttling_disabled
+from testapp.tokens import IndexedRefreshToken
+from testapp.views import logout_user, register_user
+
+
+class Command(BaseCommand):
+    """
+    Runs registrations and logouts from several threads at once against the
+    configured database to measure write throughput under lock contention.
+    Point CLMS_SQLITE_PATH at a scratch copy (or use CLMS_DB=postgres): the
+    benchmark writes real rows and deletes them afterwards.
+    """
+    help = "Benchmark concurrent registration and logout writes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help="Requests per thread")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        per_thread = options['requests']
+        factory = APIRequestFactory()
+        errors = []
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for n in range(per_thread):
+                    username = f'bench_conc_{index}_{n}'
+                    start = time.perf_counter()
+                    response = register_user(factory.post('/register/', {
+                        'username': username, 'email': f'{username}@example.com',
+                        'password': 'bench-pass-123', 'password2': 'bench-pass-123', 'role': 'student',
+                    }, format='json'))
+                    if response.status_code == 201:
+                        refresh = IndexedRefreshToken.for_user(User.objects.get(username=username))
+                        response = logout_user(factory.post('/logout/', {'refresh': str(refresh)}, format='json'))
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        if response.status_code >= 400:
+                            errors.append(response.status_code)
+            except Exception as exc:
+                with lock:
+                    errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        # Hashing and throttling are not what is being measured here, so use a
+        # fast hasher and lift the throttles on the single benchmark address.
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']), \
+                throttling_disabled():
+            pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+            start = time.perf_counter()
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            wall = time.perf_counter() - start
+
+        close_old_connections()
+        User.objects.filter(username__startswith='bench_conc_').delete()
+
+        latencies.sort()
+        done = len(latencies)
+        self.stdout.write(f"{connection.vendor}: {done} register+logout pairs in {wall:.2f}s "
+                          f"({done / wall:.1f}/s), {len(errors)} errors")
+        if latencies:
+            self.stdout.write(f"p50 {latencies[done // 2] * 1e3:.1f} ms, p95 {latencies[int(done * 0.95)] * 1e3:.1f} ms")
+        for error in errors[:5]:
+            self.stdout.write(f"  error: {error}")
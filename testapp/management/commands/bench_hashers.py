@@ -0,0 +1,62 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Reports hashes per second for the configured password hasher, inline and
+    on a thread pool, and calibrates the PBKDF2 iteration count to a target
+    per-hash latency.
+    """
+    help = "Measure password hashes per second and calibrate PBKDF2 iterations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3.0, help="Duration of each measurement")
+        parser.add_argument('--threads', type=int, default=os.cpu_count())
+        parser.add_argument('--target-ms', type=float, help="Suggest PBKDF2 iterations for this latency")
+
+    def measure(self, func, seconds, threads=1):
+        deadline = time.perf_counter() + seconds
+
+        def run():
+            count = 0
+            while time.perf_counter() < deadline:
+                func()
+                count += 1
+            return count
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            total = sum(executor.map(lambda _: run(), range(threads)))
+        return total / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        seconds = options['seconds']
+        hasher = get_hasher()
+        salt = hasher.salt()
+
+        def hash_once():
+            hasher.encode('bench-pass-123', salt)
+
+        self.stdout.write(f"hasher: {hasher.algorithm} ({hasher.__class__.__name__})")
+        inline = self.measure(hash_once, seconds)
+        self.stdout.write(f"inline: {inline:.1f} hashes/s ({1000 / inline:.1f} ms/hash)")
+        if options['threads'] > 1:
+            pooled = self.measure(hash_once, seconds, options['threads'])
+            self.stdout.write(f"{options['threads']} threads: {pooled:.1f} hashes/s")
+
+        if options['target_ms']:
+            probe = PBKDF2PasswordHasher()
+            iterations = 100_000
+            start = time.perf_counter()
+            probe.encode('bench-pass-123', salt, iterations)
+            per_iteration = (time.perf_counter() - start) / iterations
+            suggested = int(options['target_ms'] / 1000 / per_iteration) // 1000 * 1000
+            self.stdout.write(
+                f"PBKDF2 iterations for ~{options['target_ms']:g} ms/hash on this machine: {suggested} "
+                f"(set CLMS_PBKDF2_ITERATIONS)"
+            )
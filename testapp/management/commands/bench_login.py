@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from testapp.models import User
+from testapp.serializers import LoginSerializer
+from testapp.throttling import throttling_disabled
+from testapp.views import login_user
+
+
+class Command(BaseCommand):
+    """
+    Measures logins per second on a single core, comparing the old
+    serializer + authenticate() pipeline with the single-hash login_user view.
+    """
+    help = "Benchmark login throughput (logins per second per core)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        credentials = {'username': 'bench_login_user', 'password': 'bench-pass-123'}
+        factory = APIRequestFactory()
+
+        def double_hash():
+            serializer = LoginSerializer(data=credentials)
+            serializer.is_valid(raise_exception=True)
+            authenticate(None, **credentials)
+
+        def single_hash():
+            request = factory.post('/login/', credentials, format='json')
+            response = login_user(request)
+            assert response.status_code == 200, response.data
+
+        # Everything runs in a rolled-back transaction so the database is untouched.
+        # Every request comes from one address and account, so lift the login throttles.
+        with transaction.atomic(), throttling_disabled():
+            User.objects.create_user(email='bench_login@example.com', role='student',
+                                     is_approved=True, **credentials)
+            for label, func in (('before (serializer + authenticate)', double_hash),
+                                ('after (single hash)', single_hash)):
+                func()
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    func()
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{label}: {iterations / elapsed:.1f} logins/s")
+            transaction.set_rollback(True)
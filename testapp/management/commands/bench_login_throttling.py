@@ -0,0 +1,115 @@
+import itertools
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from rest_framework.test import APIRequestFactory
+
+from testapp.models import User
+from testapp.throttling import throttle_cache, throttling_disabled
+from testapp.views import login_user
+
+
+class Command(BaseCommand):
+    """
+    Measures legitimate login latency while attacker threads hammer /login/
+    with wrong passwords for real accounts, once with the login throttles
+    effectively disabled and once with the configured rates. Writes real
+    users (with the configured hasher) and deletes them afterwards; point
+    CLMS_SQLITE_PATH at a scratch copy.
+    """
+    help = "Benchmark legitimate login latency during a credential-stuffing burst."
+
+    PASSWORD = 'bench-pass-123'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attackers', type=int, default=8, help="Attacker threads")
+        parser.add_argument('--attacker-ips', type=int, default=4)
+        parser.add_argument('--rate', type=float, default=20, help="Requests per second per attacker thread, at most")
+        parser.add_argument('--victims', type=int, default=5, help="Accounts the attackers target")
+        parser.add_argument('--legit', type=int, default=30, help="Legitimate logins, one per user and address")
+        parser.add_argument('--warmup', type=float, default=20,
+                            help="Seconds of attack before measuring, so the initial bucket bursts are spent")
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory()
+        User.objects.filter(username__startswith='bench_throttle_').delete()
+        users = [User(username=f'bench_throttle_user_{n}', role='student', is_approved=True)
+                 for n in range(options['legit'] + options['victims'])]
+        for user in users:
+            user.set_password(self.PASSWORD)
+        User.objects.bulk_create(users)
+        try:
+            baseline = self.legit_logins(options['legit'])
+            self.report("idle", baseline, None)
+
+            with throttling_disabled():
+                self.report("attack, no throttling", *self.under_attack(options))
+            self.report("attack, throttled", *self.under_attack(options))
+        finally:
+            close_old_connections()
+            User.objects.filter(username__startswith='bench_throttle_').delete()
+            throttle_cache().clear()
+
+    def login(self, username, password, ip):
+        request = self.factory.post('/login/', {'username': username, 'password': password},
+                                    format='json', REMOTE_ADDR=ip)
+        start = time.perf_counter()
+        response = login_user(request)
+        return time.perf_counter() - start, response.status_code
+
+    def legit_logins(self, count):
+        latencies = []
+        for n in range(count):
+            elapsed, status_code = self.login(f'bench_throttle_user_{n}', self.PASSWORD, f'10.0.{n // 250}.{n % 250 + 1}')
+            if status_code != 200:
+                raise RuntimeError(f"Legitimate login failed with {status_code}")
+            latencies.append(elapsed)
+        return latencies
+
+    def under_attack(self, options):
+        throttle_cache().clear()
+        stop = threading.Event()
+        outcomes = []
+        lock = threading.Lock()
+        victims = [f'bench_throttle_user_{options["legit"] + n}' for n in range(options['victims'])]
+
+        def attacker(index):
+            try:
+                ip = f'203.0.113.{index % options["attacker_ips"] + 1}'
+                # Paced like traffic arriving over the network; a request that
+                # takes longer than the interval delays the next one
+                interval = 1 / options['rate']
+                due = time.perf_counter()
+                for username in itertools.cycle(victims):
+                    if stop.is_set():
+                        return
+                    _, status_code = self.login(username, 'wrong-password', ip)
+                    with lock:
+                        outcomes.append(status_code)
+                    due += interval
+                    time.sleep(max(0.0, due - time.perf_counter()))
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=attacker, args=(index,)) for index in range(options['attackers'])]
+        for thread in pool:
+            thread.start()
+        time.sleep(options['warmup'])
+        try:
+            latencies = self.legit_logins(options['legit'])
+        finally:
+            stop.set()
+            for thread in pool:
+                thread.join()
+        return latencies, outcomes
+
+    def report(self, label, latencies, outcomes):
+        latencies = sorted(latencies)
+        line = (f"{label}: legit p50 {latencies[len(latencies) // 2] * 1e3:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:.1f} ms")
+        if outcomes is not None:
+            rejected = sum(1 for status_code in outcomes if status_code == 429)
+            line += f"; attacker requests {len(outcomes)}, {rejected} throttled"
+        self.stdout.write(line)
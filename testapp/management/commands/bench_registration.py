@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from testapp.models import User
+from testapp.throttling import throttling_disabled
+from testapp.views import register_user
+
+
+class Command(BaseCommand):
+    """
+    Measures registration latency once the user table holds `--users` rows,
+    separating the email existence check from the full request (which is
+    dominated by password hashing).
+    """
+    help = "Benchmark registration latency against a large user table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--registrations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        total = options['users']
+        registrations = options['registrations']
+        password = make_password('bench-pass-123')
+        factory = APIRequestFactory()
+
+        # Everything runs in a rolled-back transaction so the database is untouched.
+        # Every request comes from one address, so lift the register throttle.
+        with transaction.atomic(), throttling_disabled():
+            self.stdout.write(f"Creating {total} users...")
+            User.objects.bulk_create(
+                (User(username=f'bench_reg_{n}', email=f'bench_reg_{n}@example.com', password=password, role='student')
+                 for n in range(total)),
+                batch_size=5000,
+            )
+
+            start = time.perf_counter()
+            for n in range(registrations):
+                User.objects.filter(email=f'bench_new_{n}@example.com').exists()
+            check = (time.perf_counter() - start) / registrations
+
+            start = time.perf_counter()
+            for n in range(registrations):
+                request = factory.post('/register/', {
+                    'username': f'bench_new_{n}', 'email': f'bench_new_{n}@example.com',
+                    'password': 'bench-pass-123', 'password2': 'bench-pass-123', 'role': 'student',
+                }, format='json')
+                response = register_user(request)
+                assert response.status_code == 201, response.data
+            latency = (time.perf_counter() - start) / registrations
+
+            self.stdout.write(f"email exists() check: {check * 1e3:.3f} ms")
+            self.stdout.write(f"registration request: {latency * 1e3:.1f} ms")
+            transaction.set_rollback(True)
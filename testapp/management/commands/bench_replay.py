@@ -0,0 +1,310 @@
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from testapp.models import User, StudentProfile
+
+DEFAULT_COLLECTION = os.path.join(settings.BASE_DIR, 'POSTMAN', 'CLMS.postman_collection.json')
+# Relative frequency of each endpoint in the replayed mix; override with --weight
+DEFAULT_WEIGHTS = {
+    'POST /login/': 4,
+    'GET /user/': 4,
+    'POST /register/': 1,
+    'POST /user/create/': 1,
+    'POST /logout/': 1,
+}
+PASSWORD = 'replay-pass-123'
+
+
+def load_collection(path):
+    """
+    Flatten a Postman collection into (endpoint, name, body) templates, where
+    endpoint is 'METHOD /path/'. Bodies are JSON with `//` comment lines
+    (as saved by Postman); bodies that are empty once those are dropped become None.
+    """
+    with open(path) as handle:
+        collection = json.load(handle)
+
+    templates = []
+
+    def walk(items):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'])
+                continue
+            request = item['request']
+            url = request['url']['raw'] if isinstance(request['url'], dict) else request['url']
+            endpoint = f"{request['method']} {urlsplit(url).path}"
+            raw = (request.get('body') or {}).get('raw', '')
+            lines = [line for line in raw.splitlines() if not line.strip().startswith('//')]
+            try:
+                body = json.loads('\n'.join(lines)) if any(line.strip() for line in lines) else None
+            except ValueError:
+                body = None
+            templates.append((endpoint, item['name'], body))
+
+    walk(collection['item'])
+    return templates
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(samples, wall):
+    results = {}
+    for endpoint, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        statuses = defaultdict(int)
+        for _, status_code in entries:
+            statuses[str(status_code)] += 1
+        results[endpoint] = {
+            'count': len(entries),
+            'throughput': round(len(entries) / wall, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1e3, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1e3, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1e3, 2),
+            'statuses': dict(statuses),
+        }
+    return results
+
+
+class Replayer:
+    """
+    One virtual client: its own keep-alive connection, client address and
+    session tokens. Template bodies are rewritten so each call is valid to
+    replay (unique usernames, pool users with known passwords, live tokens).
+    """
+    def __init__(self, index, rng, host, port, run_id, admin_token, pool, student_ids):
+        self.index = index
+        self.rng = rng
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        # Seen as the client address when the server trusts one proxy (CLMS_NUM_PROXIES=1)
+        self.address = f'10.{index // 250}.{index % 250}.1'
+        self.run_id = run_id
+        self.admin_token = admin_token
+        self.pool = pool
+        self.student_ids = student_ids
+        self.counter = itertools.count()
+        self.refresh = None
+
+    def unique(self, prefix):
+        return f'{prefix}_{self.run_id}_{self.index}_{next(self.counter)}'
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json', 'X-Forwarded-For': self.address}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return time.perf_counter() - start, 'error', None
+        return time.perf_counter() - start, response.status, content
+
+    def login(self, template):
+        body = dict(template or {}, username=self.rng.choice(self.pool), password=PASSWORD)
+        latency, status_code, content = self.request('POST', '/login/', body)
+        if status_code == 200:
+            self.refresh = json.loads(content)['tokens']['refresh']
+        return latency, status_code
+
+    def play(self, endpoint, template):
+        method, path = endpoint.split(' ', 1)
+        if path == '/login/':
+            return self.login(template)
+        if path == '/logout/':
+            if self.refresh is None:
+                return None  # nothing to log out of yet; the next login provides a token
+            body, self.refresh = {'refresh': self.refresh}, None
+            return self.request(method, path, body)[:2]
+        if path in ('/register/', '/user/create/'):
+            username = self.unique('replay')
+            body = dict(template or {}, username=username, email=f'{username}@example.com',
+                        password=PASSWORD, password2=PASSWORD)
+            if body.get('student_ids'):
+                body['student_ids'] = self.rng.sample(self.student_ids, min(len(body['student_ids']), len(self.student_ids)))
+            token = self.admin_token if path == '/user/create/' else None
+            return self.request(method, path, body, token)[:2]
+        body = template
+        if body and 'id' in body:
+            body = dict(body, id=self.rng.choice(self.student_ids))
+        return self.request(method, path, body, self.admin_token)[:2]
+
+
+class Command(BaseCommand):
+    """
+    Replays the Postman collection as a weighted, concurrent workload against
+    a running server and reports p50/p95/p99 latency and throughput per
+    endpoint, optionally diffed against a saved baseline. Seeds its own
+    users (prefixed `replay_`) through the ORM, so run it with the same
+    database settings as the server, and removes them afterwards.
+    """
+    help = "Replay the Postman collection against a server and report latency per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default=DEFAULT_COLLECTION)
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--start-server', action='store_true',
+                            help="Run `runserver` on --url for the duration, with CLMS_NUM_PROXIES=1 so "
+                                 "each virtual client gets its own throttle buckets")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent virtual clients (threads)")
+        parser.add_argument('--requests', type=int, default=400, help="Total requests to send")
+        parser.add_argument('--weight', action='append', default=[], metavar='"METHOD /path/=N"')
+        parser.add_argument('--pool', type=int, default=200, help="Seeded users the logins draw from")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results to this JSON file")
+        parser.add_argument('--baseline', help="Compare against results saved with --output")
+        parser.add_argument('--threshold', type=float, default=10.0, help="Regression threshold in percent")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        weights = dict(DEFAULT_WEIGHTS)
+        for spec in options['weight']:
+            endpoint, _, value = spec.rpartition('=')
+            weights[endpoint.strip()] = float(value)
+
+        templates = defaultdict(list)
+        for endpoint, _, body in load_collection(options['collection']):
+            templates[endpoint].append(body)
+        mix = [(endpoint, weights.get(endpoint, 0)) for endpoint in templates if weights.get(endpoint, 0) > 0]
+        if not mix:
+            raise CommandError("No weighted endpoints found in the collection.")
+
+        url = urlsplit(options['url'])
+        host, port = url.hostname, url.port or 80
+        server = self.start_server(host, port) if options['start_server'] else None
+        run_id = f'{int(time.time()) % 100000}'
+        try:
+            admin_token, pool, student_ids = self.seed_users(options['pool'], run_id, host, port)
+            samples, wall = self.replay(options, mix, templates, host, port, run_id, admin_token, pool, student_ids)
+        finally:
+            User.objects.filter(username__startswith='replay_').delete()
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        results = {'clients': options['clients'], 'wall_s': round(wall, 2), 'endpoints': summarize(samples, wall)}
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                regressions = self.diff(json.load(handle), results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} latency regressions over {options['threshold']}%")
+
+    def start_server(self, host, port):
+        env = dict(os.environ, CLMS_NUM_PROXIES='1')  # each virtual client gets its own throttle buckets
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload', f'{host}:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"Server did not start on {host}:{port}")
+
+    def seed_users(self, pool_size, run_id, host, port):
+        # One hash shared by every seeded user keeps setup fast
+        encoded = make_password(PASSWORD)
+        User.objects.filter(username__startswith='replay_').delete()
+        User.objects.create(username=f'replay_admin_{run_id}', email=f'replay_admin_{run_id}@example.com',
+                            password=encoded, role='admin', is_approved=True)
+        users = User.objects.bulk_create(
+            User(username=f'replay_pool_{run_id}_{n}', email=f'replay_pool_{run_id}_{n}@example.com',
+                 password=encoded, role='student', is_approved=True)
+            for n in range(pool_size)
+        )
+        StudentProfile.objects.bulk_create(StudentProfile(user=user) for user in users)
+
+        client = http.client.HTTPConnection(host, port, timeout=60)
+        client.request('POST', '/login/', body=json.dumps({'username': f'replay_admin_{run_id}', 'password': PASSWORD}),
+                       headers={'Content-Type': 'application/json', 'X-Forwarded-For': '10.255.255.1'})
+        response = client.getresponse()
+        content = response.read()
+        client.close()
+        if response.status != 200:
+            raise CommandError(f"Admin login failed ({response.status}): {content[:200]!r}")
+        return json.loads(content)['tokens']['access'], [user.username for user in users], [user.id for user in users]
+
+    def replay(self, options, mix, templates, host, port, run_id, admin_token, pool, student_ids):
+        endpoints = [endpoint for endpoint, _ in mix]
+        weights = [weight for _, weight in mix]
+        remaining = itertools.count()
+        samples = defaultdict(list)
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            replayer = Replayer(index, rng, host, port, run_id, admin_token, pool, student_ids)
+            while next(remaining) < options['requests']:
+                endpoint = rng.choices(endpoints, weights)[0]
+                outcome = replayer.play(endpoint, rng.choice(templates[endpoint]))
+                if outcome is not None:
+                    with lock:
+                        samples[endpoint].append(outcome)
+            replayer.connection.close()
+
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(options['clients'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    def report(self, results):
+        self.stdout.write(f"{results['clients']} clients, {results['wall_s']} s")
+        self.stdout.write(f"{'endpoint':<22}{'count':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+        for endpoint, row in results['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<22}{row['count']:>7}{row['throughput']:>9}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                f"{row['p99_ms']:>10}  {row['statuses']}"
+            )
+
+    def diff(self, baseline, results, threshold):
+        """Print per-endpoint percentile changes; return the ones slower by more than `threshold` percent."""
+        regressions = []
+        self.stdout.write(f"\nvs baseline (regression threshold {threshold}%)")
+        for endpoint, row in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(endpoint)
+            if before is None:
+                self.stdout.write(f"{endpoint:<22}  new endpoint")
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                change = (row[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                flag = ' !' if change > threshold else ''
+                if flag:
+                    regressions.append((endpoint, key, change))
+                changes.append(f"{key[:3]} {before[key]} -> {row[key]} ({change:+.1f}%){flag}")
+            self.stdout.write(f"{endpoint:<22}  " + ', '.join(changes))
+        return regressions
@@ -0,0 +1,124 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Names written by testapp/images.py: the digest in the name fixes the content
+CONTENT_ADDRESSED = re.compile(r'^(profile_images|thumbnails)/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64}(-\d+)?)\.\w+$')
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def media_validators(path, stat):
+    """Strong ETag and Cache-Control for a media file."""
+    match = CONTENT_ADDRESSED.match(path)
+    if match:
+        return f'"{match["digest"]}"', 'public, max-age=31536000, immutable'
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', f'public, max-age={max_age}'
+
+
+def parse_range(header, size):
+    """(start, end) of a single `bytes=` range, None to send the whole file, or 'invalid'."""
+    match = RANGE.match(header.strip())
+    if not match:
+        return None  # Multiple or unknown ranges: ignoring Range is allowed
+    start, end = match['start'], match['end']
+    if not start:
+        if not end or int(end) == 0:
+            return 'invalid'
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT according to MEDIA_SERVING:
+
+    - 'file': a `FileResponse`, which WSGI servers with `wsgi.file_wrapper`
+      (gunicorn, uWSGI) hand to sendfile(), plus single-range requests;
+    - 'x-accel-redirect' (nginx) / 'x-sendfile' (Apache, lighttpd): an empty
+      response telling the front server which file to send.
+
+    Django answers conditional requests itself in every mode, so unchanged
+    avatars cost a 304 and no file access.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Media file not found.")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Media file not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found.")
+
+    etag, cache_control = media_validators(path, stat)
+    last_modified = http_date(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = build_media_response(request, path, full_path, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def build_media_response(request, path, full_path, stat, etag):
+    mode = getattr(settings, 'MEDIA_SERVING', 'file')
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/') + path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    requested = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if requested and (if_range is None or if_range == etag):
+        byte_range = parse_range(requested, stat.st_size)
+        if byte_range == 'invalid':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            # Not a FileResponse: file_wrapper would send past `end`
+            response = StreamingHttpResponse(read_range(full_path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:25
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_mappings(apps, schema_editor):
+    ParentStudentMapping = apps.get_model('testapp', 'ParentStudentMapping')
+    keep = ParentStudentMapping.objects.values('parent', 'student').annotate(keep_id=Min('id')).values('keep_id')
+    ParentStudentMapping.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0005_remove_parentstudentmapping_relationship'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_mappings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='parentstudentmapping',
+            constraint=models.UniqueConstraint(fields=('parent', 'student'), name='unique_parent_student'),
+        ),
+    ]
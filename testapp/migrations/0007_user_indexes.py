@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    The old Python uniqueness checks could race, so existing rows may share
+    an email. Stop before any schema change and list them; which account
+    keeps the address is for an administrator to decide.
+    """
+    User = apps.get_model('testapp', 'User')
+    duplicates = list(
+        User.objects.exclude(email='').values('email').annotate(users=Count('id')).filter(users__gt=1)
+        .order_by('email').values_list('email', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Cannot add unique_user_email: these emails belong to more than one user: "
+            + ', '.join(duplicates)
+            + ". Change or blank them so each is used once, then run migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('testapp', '0006_parentstudentmapping_unique_parent_student'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='user_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'id'], name='user_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_approved', 'id'], name='user_is_approved_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('email',), name='unique_user_email'),
+        ),
+    ]
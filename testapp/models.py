@@ -13,7 +13,23 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     is_approved = models.BooleanField(default=False)
     profile_image = models.ImageField(upload_to='profile_images/', default='default/default_profile.jpg', blank=True)
+    # Thumbnail names by size, plus the image they were made from (see testapp/images.py)
+    profile_thumbnails = models.JSONField(default=dict, blank=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # varchar_pattern_ops (PostgreSQL only) serves both equality and prefix (LIKE 'x%') lookups
+            models.Index(fields=['email'], name='user_email_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+            models.Index(fields=['role', 'id'], name='user_role_idx'),
+            models.Index(fields=['is_approved', 'id'], name='user_is_approved_idx'),
+        ]
+        constraints = [
+            # Email is optional on AbstractUser, so only non-blank addresses must be unique
+            models.UniqueConstraint(fields=['email'], condition=~models.Q(email=''), name='unique_user_email'),
+        ]
 
     def __str__(self):
         return self.username
@@ -22,6 +38,7 @@ class User(AbstractUser):
 class StudentProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="student_profile")
     enrollment_date =models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.user.username
@@ -30,6 +47,7 @@ class StudentProfile(models.Model):
 class ParentProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='parent_profile')
     relationship = models.CharField(max_length=20)  # e.g., Father, Mother, Guardian
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.user.username} ({self.relationship})"
@@ -47,6 +65,11 @@ class ParentStudentMapping(models.Model):
         related_name='parent_mappings'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['parent', 'student'], name='unique_parent_student'),
+        ]
+
     def __str__(self):
         return f"{self.parent.user.username} -> {self.student.user.username} ({self.parent.relationship}) "
 
@@ -56,6 +79,7 @@ class ParentStudentMapping(models.Model):
 class TeacherProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="teacher_profile")
     enrollment_date = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.user.username
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def contains_float(data):
+    """
+    Whether `data` holds a float, or a Decimal (which DRF's encoder turns
+    into one), anywhere in its dicts, lists and tuples.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (float, Decimal)):
+            return True
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` that encodes with orjson when it is installed. For data
+    without floats the bytes are the same as the stdlib path: datetimes and
+    other non-native types go through DRF's encoder, output is compact UTF-8,
+    and U+2028/U+2029 are escaped. orjson formats floats differently (`1e16`
+    rather than `1e+16`) and writes `null` for NaN and Infinity where the
+    strict renderer raises, so data containing floats, indented output and
+    non-compact settings fall back to the parent.
+    """
+    encoder = JSONRenderer.encoder_class()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or not self.strict or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if contains_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -1,10 +1,13 @@
 from .models import User
 from rest_framework import serializers
 
-from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.tokens import TokenError
+from .hashers import hash_password
+from .tokens import IndexedRefreshToken
 
 
 # registration
@@ -23,6 +26,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password', 'password2', 'role', 'phone_number']
         extra_kwargs = {
             'password': {'write_only': True, 'style': {'input_type': 'password'}},
+            # Email uniqueness is checked in validate() with its own error message
+            'email': {'validators': []},
         }
 
     def validate(self, attrs):
@@ -46,8 +51,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        validated_data['password'] = make_password(validated_data['password'])
-        return User.objects.create(**validated_data)
+        validated_data['password'] = hash_password(validated_data['password'])
+        try:
+            with transaction.atomic():
+                return User.objects.create(**validated_data)
+        except IntegrityError:
+            # Another request registered the same username or email after validation
+            raise serializers.ValidationError({'error': 'A user with that username or email already exists.'})
 
 # login
 class LoginSerializer(serializers.Serializer):
@@ -116,6 +126,11 @@ class LogoutSerializer(serializers.Serializer):
     def save(self, **kwargs):
         try:
             # Blacklist the refresh token
-            RefreshToken(self.token).blacklist()
+            IndexedRefreshToken(self.token).blacklist()
         except TokenError:
             raise serializers.ValidationError('Invalid or expired token')
+
+
+# refresh
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    token_class = IndexedRefreshToken
@@ -1,3 +1,571 @@
-from django.test import TestCase
+import http.client
+import io
+import json
+import os
+import shutil
+import threading
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from wsgiref.simple_server import WSGIRequestHandler, make_server
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password, make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from PIL import Image
+
+from .authentication import SnapshotCache, UserSnapshot, user_snapshots
+from .hashers import get_hashing_executor, hash_password
+from .images import avatar_urls
+from .models import User
+from .renderers import FastJSONRenderer
+from .throttling import LoginIPThrottle, throttle_cache, throttling_disabled
+from .tokens import IndexedRefreshToken, RevocationIndex, revocation_index
+
+
+class LoginTests(TestCase):
+
+    def setUp(self):
+        throttle_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='alice', email='alice@example.com', password='s3cret-pass',
+            role='student', is_approved=True,
+        )
+
+    def test_login_returns_tokens_and_user(self):
+        response = self.client.post('/login/', {'username': 'alice', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data['tokens'])
+        self.assertEqual(response.data['user'], {
+            'id': self.user.id,
+            'username': 'alice',
+            'email': 'alice@example.com',
+            'role': 'student',
+        })
+
+    def test_login_hashes_password_once(self):
+        with mock.patch.object(PBKDF2PasswordHasher, 'verify', autospec=True,
+                               side_effect=PBKDF2PasswordHasher.verify) as verify:
+            response = self.client.post('/login/', {'username': 'alice', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_login_wrong_password(self):
+        response = self.client.post('/login/', {'username': 'alice', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], ['Incorrect password.'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SnapshotAuthenticationTests(TestCase):
+
+    def setUp(self):
+        user_snapshots.clear()
+        self.admin = User.objects.create_user(
+            username='boss', email='boss@example.com', password='pw-12345', role='admin', is_approved=True,
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+
+    def test_snapshot_is_cached_between_requests(self):
+        with mock.patch.object(UserSnapshot, '__init__', autospec=True, side_effect=UserSnapshot.__init__) as snapshot:
+            self.assertEqual(self.client.get('/user/').status_code, 200)
+            self.assertEqual(self.client.get('/user/').status_code, 200)
+        self.assertEqual(snapshot.call_count, 1)
+
+    def test_role_change_invalidates_snapshot(self):
+        self.assertEqual(self.client.get('/user/').status_code, 200)
+        response = self.client.put('/user/', {'id': self.admin.id, 'role': 'teacher'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/user/').status_code, 403)
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/user/').status_code, 401)
+
+    def test_cache_evicts_least_recently_used_and_expired_entries(self):
+        cache = SnapshotCache(max_size=2, ttl=60)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), 'a')
+        with mock.patch('testapp.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(1))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenRevocationTests(TestCase):
+
+    def setUp(self):
+        revocation_index.reset()
+        self.user = User.objects.create_user(
+            username='bob', email='bob@example.com', password='pw-12345', role='teacher', is_approved=True,
+        )
+        self.client = APIClient()
+        self.refresh = str(IndexedRefreshToken.for_user(self.user))
+
+    def test_refresh_rotates_and_blacklists_old_token(self):
+        response = self.client.post('/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+
+        response = self.client.post('/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logged_out_token_cannot_refresh(self):
+        self.assertEqual(self.client.post('/logout/', {'refresh': self.refresh}, format='json').status_code, 200)
+        response = self.client.post('/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_checks_skip_database_between_syncs(self):
+        IndexedRefreshToken(self.refresh)
+        with CaptureQueriesContext(connection) as queries:
+            IndexedRefreshToken(self.refresh)
+        self.assertEqual(len(queries), 0)
+
+    def test_sync_picks_up_tokens_blacklisted_elsewhere(self):
+        IndexedRefreshToken(self.refresh)
+        RefreshToken(self.refresh).blacklist()  # e.g. another worker
+        IndexedRefreshToken(self.refresh)  # not visible until the next sync
+        revocation_index.sync()
+        with self.assertRaises(TokenError):
+            IndexedRefreshToken(self.refresh)
+
+    def test_due_sync_runs_once_while_others_use_current_index(self):
+        index = RevocationIndex(sync_interval=60)
+        index.sync()
+        index.add('revoked', time.time() + 60)
+        index._next_sync = 0
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_sync():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(index, 'sync', side_effect=slow_sync):
+            syncing = threading.Thread(target=index.contains, args=('other', time.time() + 60))
+            syncing.start()
+            started.wait(5)
+            # Answered from the current index without waiting or starting another scan
+            self.assertTrue(index.contains('revoked', time.time() + 60))
+            release.set()
+            syncing.join()
+        self.assertEqual(len(calls), 1)
+
+    def test_purge_expired_tokens(self):
+        token = IndexedRefreshToken(self.refresh)
+        token.blacklist()
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        fresh = IndexedRefreshToken.for_user(self.user)
+        call_command('purge_expired_tokens', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [fresh['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistrationTests(TestCase):
+
+    def setUp(self):
+        throttle_cache().clear()
+        self.client = APIClient()
+        User.objects.create_user(username='taken', email='taken@example.com', password='pw-12345', role='guest')
+
+    def register(self, username, email):
+        return self.client.post('/register/', {
+            'username': username, 'email': email, 'password': 'pw-12345', 'password2': 'pw-12345', 'role': 'student',
+        }, format='json')
+
+    def test_register_user(self):
+        response = self.register('carol', 'carol@example.com')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(User.objects.get(username='carol').is_approved)
+
+    def test_duplicate_email_is_rejected(self):
+        response = self.register('carol', 'taken@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['email'], ['Email is already taken.'])
+
+    def test_duplicate_email_is_enforced_by_the_database(self):
+        # Simulates a concurrent registration slipping past the exists() check
+        with mock.patch('django.db.models.query.QuerySet.exists', return_value=False):
+            response = self.register('carol', 'taken@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(email='taken@example.com').count(), 1)
+
+    def test_blank_emails_may_repeat(self):
+        User.objects.create_user(username='no_email_1', email='', password='pw-12345', role='guest')
+        User.objects.create_user(username='no_email_2', email='', password='pw-12345', role='guest')
+
+    def test_email_lookup_uses_an_index(self):
+        plan = User.objects.filter(email='taken@example.com').explain()
+        self.assertIn('INDEX', plan.upper())
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_pragmas_are_applied_to_connections(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+@override_settings(PASSWORD_HASHERS=['testapp.hashers.TunedPBKDF2PasswordHasher'], PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+
+    def setUp(self):
+        throttle_cache().clear()
+
+    def test_work_factor_comes_from_settings(self):
+        self.assertTrue(make_password('pw-12345').startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_rehashes_when_work_factor_changes(self):
+        user = User.objects.create_user(
+            username='dave', email='dave@example.com', password='pw-12345', role='guest', is_approved=True,
+        )
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            response = APIClient().post('/login/', {'username': 'dave', 'password': 'pw-12345'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASHING_POOL='thread', PASSWORD_HASHING_POOL_SIZE=2)
+    def test_hash_password_on_thread_pool(self):
+        with mock.patch.dict('testapp.hashers._executors', clear=True):
+            encoded = hash_password('pw-12345')
+            executor = get_hashing_executor()
+            with override_settings(PASSWORD_HASHING_POOL_SIZE=3):
+                resized = get_hashing_executor()
+        executor.shutdown()
+        resized.shutdown()
+        self.assertTrue(check_password('pw-12345', encoded))
+        # Pools are keyed on the configured kind and size
+        self.assertIsNot(resized, executor)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncAuthViewTests(TestCase):
+
+    def setUp(self):
+        revocation_index.reset()
+        throttle_cache().clear()
+        User.objects.create_user(
+            username='erin', email='erin@example.com', password='pw-12345', role='teacher', is_approved=True,
+        )
+
+    async def test_register_login_logout(self):
+        client = AsyncClient()
+        response = await client.post('/async/register/', {
+            'username': 'frank', 'email': 'frank@example.com', 'password': 'pw-12345', 'password2': 'pw-12345',
+            'role': 'student',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await User.objects.filter(username='frank', is_approved=False).aexists())
+
+        response = await client.post('/async/login/', {'username': 'erin', 'password': 'pw-12345'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['user']['role'], 'teacher')
+
+        response = await client.post('/async/logout/', {'refresh': body['tokens']['refresh']},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = await client.post('/async/logout/', {'refresh': body['tokens']['refresh']},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_errors_match_the_sync_endpoints(self):
+        client = AsyncClient()
+        cases = [
+            ('/login/', '/async/login/', {'username': 'erin', 'password': 'wrong'}),
+            ('/login/', '/async/login/', {'username': 'nobody', 'password': 'pw-12345'}),
+            ('/login/', '/async/login/', {'username': ''}),
+            ('/register/', '/async/register/', {'username': 'erin', 'email': 'x@example.com', 'password': 'a',
+                                                'password2': 'a', 'role': 'guest'}),
+            ('/register/', '/async/register/', {'username': 'gina', 'email': 'erin@example.com', 'password': 'a',
+                                                'password2': 'a', 'role': 'guest'}),
+            ('/register/', '/async/register/', {'username': 'gina', 'email': 'g@example.com', 'password': 'a',
+                                                'password2': 'b', 'role': 'guest'}),
+        ]
+        for sync_url, async_url, data in cases:
+            expected = await sync_to_async(APIClient().post)(sync_url, data, format='json')
+            response = await client.post(async_url, data, content_type='application/json')
+            self.assertEqual(response.status_code, expected.status_code, async_url)
+            self.assertEqual(response.json(), json.loads(expected.content), async_url)
+
+
+class FastJSONRendererTests(TestCase):
+
+    PAYLOAD = {
+        'id': 1,
+        'username': 'caf\u00e9 \u2028 \u2029 "quoted"',
+        'joined': timezone.now(),
+        'enrollment_date': timezone.now().date(),
+        'scores': [1, None, True],
+        2: 'int key',
+    }
+
+    def test_output_matches_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.PAYLOAD), JSONRenderer().render(self.PAYLOAD))
+
+    def test_floats_fall_back(self):
+        payload = {'large': 1e16, 'small': 1e-7, 'decimal': Decimal('1e16'), 'nested': [{'score': 0.1}]}
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        for value in (float('nan'), float('inf'), Decimal('NaN')):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'scores': [value]})
+
+    def test_indented_output_falls_back(self):
+        context = {'indent': 2}
+        self.assertEqual(
+            FastJSONRenderer().render(self.PAYLOAD, 'application/json', context),
+            JSONRenderer().render(self.PAYLOAD, 'application/json', context),
+        )
+
+    def test_without_orjson_falls_back(self):
+        with mock.patch('testapp.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.PAYLOAD), JSONRenderer().render(self.PAYLOAD))
+
+
+def image_bytes(color, size=(400, 300)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], PROFILE_IMAGE_PROCESSING='inline')
+class ProfileImageTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=media.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        default_storage.save('default/default_profile.jpg', ContentFile(image_bytes('grey')))
+
+    def make_user(self, username, image=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User(username=username, email=f'{username}@example.com', role='student')
+            if image is not None:
+                user.profile_image = SimpleUploadedFile(f'{username}.png', image)
+            user.save()
+        user.refresh_from_db()
+        return user
+
+    def test_upload_is_renamed_and_thumbnailed(self):
+        user = self.make_user('pic', image_bytes('red'))
+        self.assertRegex(user.profile_image.name, r'^profile_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(user.profile_thumbnails['source'], user.profile_image.name)
+        with default_storage.open(user.profile_thumbnails['small']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (64, 64))
+        # The upload under its original name is gone
+        self.assertEqual(default_storage.listdir('profile_images')[1], [])
+
+    def test_identical_images_are_stored_once(self):
+        first = self.make_user('first', image_bytes('blue'))
+        second = self.make_user('second', image_bytes('blue'))
+        third = self.make_user('third', image_bytes('green'))
+        self.assertEqual(first.profile_image.name, second.profile_image.name)
+        self.assertEqual(first.profile_thumbnails, second.profile_thumbnails)
+        self.assertNotEqual(first.profile_image.name, third.profile_image.name)
+
+    def test_default_image_is_shared(self):
+        first, second = self.make_user('plain1'), self.make_user('plain2')
+        self.assertEqual(first.profile_thumbnails, second.profile_thumbnails)
+        self.assertTrue(default_storage.exists('default/default_profile.jpg'))
+
+    def test_avatar_urls_fall_back_until_rendered(self):
+        self.assertEqual(avatar_urls('default/default_profile.jpg', {}), {
+            'original': '/media/default/default_profile.jpg',
+            'small': '/media/default/default_profile.jpg',
+            'medium': '/media/default/default_profile.jpg',
+        })
+        user = self.make_user('ready', image_bytes('yellow'))
+        urls = avatar_urls(user.profile_image.name, user.profile_thumbnails)
+        self.assertEqual(urls['medium'], f"/media/{user.profile_thumbnails['medium']}")
+        self.assertTrue(urls['small'].endswith('-64.jpg'))
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class MediaServingTests(SimpleTestCase):
+    """
+    Runs against a local wsgiref server, which like gunicorn provides
+    wsgi.file_wrapper (the live test server would serve /media/ itself).
+    """
+
+    DIGEST = 'ab' * 32
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+        cls.thumbnail = f'thumbnails/ab/{cls.DIGEST}-64.jpg'
+        cls.content = bytes(range(256)) * 40
+        for name in (cls.thumbnail, 'default/default_profile.jpg'):
+            os.makedirs(os.path.dirname(os.path.join(cls.media_root, name)), exist_ok=True)
+            with open(os.path.join(cls.media_root, name), 'wb') as handle:
+                handle.write(cls.content)
+
+        cls.server = make_server('127.0.0.1', 0, WSGIHandler(), handler_class=QuietRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def fetch(self, path, **headers):
+        client = http.client.HTTPConnection(*self.server.server_address)
+        self.addCleanup(client.close)
+        client.request('GET', f'/media/{path}', headers={'Host': 'testserver', **headers})
+        response = client.getresponse()
+        return response, response.read()
+
+    def test_content_addressed_files_are_immutable(self):
+        response, body = self.fetch(self.thumbnail)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response.getheader('ETag'), f'"{self.DIGEST}-64"')
+        self.assertEqual(response.getheader('Cache-Control'), 'public, max-age=31536000, immutable')
+        self.assertEqual(response.getheader('Content-Type'), 'image/jpeg')
+
+    def test_other_files_get_a_shorter_max_age(self):
+        response, _ = self.fetch('default/default_profile.jpg')
+        self.assertEqual(response.getheader('Cache-Control'), 'public, max-age=3600')
+        self.assertRegex(response.getheader('ETag'), r'^"[0-9a-f]+-[0-9a-f]+"$')
+
+    def test_conditional_get(self):
+        response, body = self.fetch(self.thumbnail, **{'If-None-Match': f'"{self.DIGEST}-64"'})
+        self.assertEqual((response.status, body), (304, b''))
+
+    def test_range_requests(self):
+        response, body = self.fetch(self.thumbnail, Range='bytes=10-19')
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(response.getheader('Content-Range'), f'bytes 10-19/{len(self.content)}')
+
+        response, body = self.fetch(self.thumbnail, Range='bytes=-5')
+        self.assertEqual(body, self.content[-5:])
+
+        response, _ = self.fetch(self.thumbnail, Range=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status, 416)
+
+        # A stale If-Range gets the whole file
+        response, body = self.fetch(self.thumbnail, Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual((response.status, len(body)), (200, len(self.content)))
+
+    def test_front_server_modes(self):
+        with override_settings(MEDIA_SERVING='x-accel-redirect'):
+            response, body = self.fetch(self.thumbnail)
+        self.assertEqual(response.getheader('X-Accel-Redirect'), f'/protected-media/{self.thumbnail}')
+        self.assertEqual(body, b'')
+        with override_settings(MEDIA_SERVING='x-sendfile'):
+            response, body = self.fetch(self.thumbnail)
+        self.assertEqual(response.getheader('X-Sendfile'), os.path.join(self.media_root, self.thumbnail))
+        self.assertEqual(response.getheader('ETag'), f'"{self.DIGEST}-64"')
+
+    def test_paths_outside_media_root_are_not_found(self):
+        response, _ = self.fetch('../manage.py')
+        self.assertEqual(response.status, 404)
+        response, _ = self.fetch('missing.jpg')
+        self.assertEqual(response.status, 404)
+
+
+THROTTLE_TEST_RATES = {'login_ip': '5/min', 'login_username': '3/min', 'register_ip': '2/hour'}
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': THROTTLE_TEST_RATES},
+)
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        throttle_cache().clear()
+        self.client = APIClient()
+        User.objects.create_user(username='frank', email='frank@example.com', password='pw-12345', role='teacher', is_approved=True)
+
+    def login(self, username='frank', password='wrong', ip='198.51.100.1'):
+        return self.client.post('/login/', {'username': username, 'password': password}, format='json', REMOTE_ADDR=ip)
+
+    def test_username_bucket_rejects_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 400)
+        with mock.patch.object(User, 'check_password') as check:
+            response = self.login(password='pw-12345', ip='198.51.100.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        check.assert_not_called()
+
+    def test_ip_bucket_covers_many_usernames(self):
+        for n in range(5):
+            self.login(username=f'guess{n}')
+        self.assertEqual(self.login(username='guess5').status_code, 429)
+        # Another address is unaffected
+        self.assertEqual(self.login(password='pw-12345', ip='198.51.100.9').status_code, 200)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        for n in range(5):
+            self.client.post('/login/', {'username': f'guess{n}', 'password': 'x'}, format='json',
+                             REMOTE_ADDR='198.51.100.1', HTTP_X_FORWARDED_FOR=f'10.0.0.{n}')
+        self.assertEqual(self.login(username='guess5').status_code, 429)
+
+    def test_bucket_refills_over_time(self):
+        now = time.time()
+        with mock.patch.object(LoginIPThrottle, 'timer', return_value=now):
+            for n in range(5):
+                self.login(username=f'guess{n}')
+            self.assertEqual(self.login(username='guess5').status_code, 429)
+        with mock.patch.object(LoginIPThrottle, 'timer', return_value=now + 12):
+            self.assertEqual(self.login(username='guess6').status_code, 400)
+            self.assertEqual(self.login(username='guess7').status_code, 429)
+
+    def test_register_is_throttled_by_ip(self):
+        for n in range(2):
+            self.client.post('/register/', {'username': f'new{n}'}, format='json')
+        response = self.client.post('/register/', {'username': 'new2'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1800')
+
+    def test_throttling_disabled_lifts_every_bucket(self):
+        with throttling_disabled():
+            statuses = {self.login(username=f'guess{n % 2}').status_code for n in range(12)}
+        self.assertEqual(statuses, {400})
+
+    async def test_async_login_is_throttled(self):
+        client = AsyncClient()
+        for _ in range(3):
+            await client.post('/async/login/', {'username': 'Frank', 'password': 'wrong'}, content_type='application/json')
+        response = await client.post('/async/login/', {'username': 'frank', 'password': 'pw-12345'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
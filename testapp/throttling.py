@@ -0,0 +1,127 @@
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+
+def throttle_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per key: `num/period` from DEFAULT_THROTTLE_RATES[scope] is
+    both the burst size and the refill rate. A check is one cache get and
+    one set, and rejected requests do not consume tokens. Buckets live in the
+    THROTTLE_CACHE_ALIAS cache, so they are shared by the threads of a
+    process (locmem) or by every worker (a shared backend). Concurrent
+    checks on one key can race and let an extra request through.
+    """
+    scope = None
+    timer = time.time
+
+    def __init__(self):
+        # Rates are read per request, like the rest of api_settings, so overrides apply
+        self.capacity, period = SimpleRateThrottle.parse_rate(self, api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+        self.refill_rate = self.capacity / period if self.capacity else None  # tokens per second
+        self.retry_after = None
+
+    def get_key(self, request):
+        """Bucket key for `request`, or None to skip throttling it."""
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        if self.capacity is None:  # a None rate disables the throttle, as in DRF
+            return True
+        key = self.get_key(request)
+        if key is None:
+            return True
+        key = f'throttle:{self.scope}:{key}'
+        cache = throttle_cache()
+        now = self.timer()
+        tokens, updated = cache.get(key) or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.retry_after = (1 - tokens) / self.refill_rate
+        # An idle bucket refills completely in this time, so it can simply expire
+        cache.set(key, (tokens, now), timeout=math.ceil((self.capacity - tokens) / self.refill_rate) + 1)
+        return allowed
+
+    def wait(self):
+        # Retry-After is whole seconds; round up so clients never retry too early
+        return math.ceil(self.retry_after) if self.retry_after is not None else None
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    """Keyed by the submitted username, so one account is protected from many IPs."""
+    def get_key(self, request):
+        data = getattr(request, 'data', None)
+        if data is None:  # plain Django request (async views)
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        username = data.get('username') if hasattr(data, 'get') else None
+        return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginUsernameThrottle(UsernameThrottle):
+    scope = 'login_username'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginUsernameThrottle]
+REGISTER_THROTTLES = [RegisterIPThrottle]
+
+
+def throttling_disabled():
+    """
+    `override_settings` that sets every throttle rate to None, for benchmarks
+    measuring something other than throttling from a single address.
+    """
+    rates = {scope: None for scope in api_settings.DEFAULT_THROTTLE_RATES}
+    return override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+def throttled_response(request, throttle_classes):
+    """
+    Throttle check for the plain Django async views: a 429 JsonResponse
+    with Retry-After, or None when every throttle allows the request.
+    """
+    waits = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if not waits:
+        return None
+    wait = max(waits)
+    response = JsonResponse(
+        {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    response['Retry-After'] = str(wait)
+    return response
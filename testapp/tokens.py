@@ -0,0 +1,105 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class RevocationIndex:
+    """
+    In-memory set of blacklisted refresh token jtis, bucketed by the hour the
+    token expires so expired buckets can be dropped wholesale.
+
+    The index is refreshed from `BlacklistedToken` at most every
+    `sync_interval` seconds, so a lookup only reaches the database when a sync
+    is due. Tokens blacklisted by this process are added immediately; ones
+    blacklisted by another worker become visible after the next sync.
+    """
+    BUCKET_SECONDS = 3600
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._buckets = {}
+        self._synced_at = None
+        self._next_sync = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.RLock()  # held by the one thread running a sync
+
+    def _bucket(self, exp):
+        return int(exp) // self.BUCKET_SECONDS
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._buckets.setdefault(self._bucket(exp), set()).add(jti)
+
+    def contains(self, jti, exp):
+        if time.monotonic() >= self._next_sync:
+            self._sync_if_due()
+        return jti in self._buckets.get(self._bucket(exp), ())
+
+    def _sync_if_due(self):
+        # One caller syncs while the others keep answering from the current
+        # index; only before the first sync, when there is no index yet, do
+        # they wait for it instead.
+        if not self._sync_lock.acquire(blocking=self._synced_at is None):
+            return
+        try:
+            if time.monotonic() >= self._next_sync:
+                self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def sync(self):
+        with self._sync_lock:
+            # Claimed before querying, so callers arriving meanwhile do not start their own scan
+            self._next_sync = time.monotonic() + self.sync_interval
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._synced_at is not None:
+                # Overlap the previous sync window to allow for clock skew between workers
+                rows = rows.filter(blacklisted_at__gte=self._synced_at - timedelta(seconds=self.sync_interval + 5))
+            rows = rows.values_list('token__jti', 'token__expires_at')
+
+            try:
+                fetched = list(rows.iterator(chunk_size=10000))
+            except Exception:
+                self._next_sync = 0  # let the next lookup retry
+                raise
+            with self._lock:
+                for jti, expires_at in fetched:
+                    self._buckets.setdefault(self._bucket(expires_at.timestamp()), set()).add(jti)
+                expired = self._bucket(now.timestamp())
+                for bucket in [bucket for bucket in self._buckets if bucket < expired]:
+                    del self._buckets[bucket]
+                self._synced_at = now
+
+    def reset(self):
+        with self._sync_lock, self._lock:
+            self._buckets.clear()
+            self._synced_at = None
+            self._next_sync = 0
+
+
+revocation_index = RevocationIndex(sync_interval=getattr(settings, 'REVOCATION_INDEX_SYNC_INTERVAL', 5))
+
+
+class IndexedRefreshToken(RefreshToken):
+    """
+    Refresh token that checks the in-memory `revocation_index` instead of
+    querying `BlacklistedToken` on every verification.
+    """
+
+    def check_blacklist(self):
+        if revocation_index.contains(self.payload[api_settings.JTI_CLAIM], self.payload['exp']):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        revocation_index.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        return result
@@ -6,4 +6,10 @@ urlpatterns = [
     path('register/', views.register_user, name='register_user'),
     path('login/', views.login_user, name='login_user'),
     path('logout/', views.logout_user, name='logout_user'),
+    path('token/refresh/', views.refresh_token, name='refresh_token'),
+
+    # Async variants for ASGI deployments (uvicorn CLMS.asgi:application)
+    path('async/register/', views.register_user_async, name='register_user_async'),
+    path('async/login/', views.login_user_async, name='login_user_async'),
+    path('async/logout/', views.logout_user_async, name='logout_user_async'),
 ]
@@ -1,17 +1,34 @@
-from rest_framework.decorators import api_view, permission_classes
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.tokens import TokenError
 
 
-from .serializers import UserRegistrationSerializer, LoginSerializer, LogoutSerializer
+from .hashers import get_hashing_executor
+from .models import User
+from .serializers import UserRegistrationSerializer, LoginSerializer, LogoutSerializer, TokenRefreshSerializer
+from .throttling import LOGIN_THROTTLES, REGISTER_THROTTLES, throttled_response
+from .tokens import IndexedRefreshToken
 
 
 
 
+# Throttles run in DRF's initial(), before the view body, so throttled
+# requests never reach password hashing.
 @api_view(['POST'])
+@throttle_classes(REGISTER_THROTTLES)
 def register_user(request):
     serializer = UserRegistrationSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
@@ -21,16 +38,15 @@ def register_user(request):
 
 
 @api_view(['POST'])
+@throttle_classes(LOGIN_THROTTLES)
 def login_user(request):
     serializer = LoginSerializer(data=request.data)
     if serializer.is_valid():
-        username = serializer.validated_data['username']
-        password = serializer.validated_data['password']
-        user = authenticate(request, username=username, password=password)
-        if user is not None:
-            
-            refresh = RefreshToken.for_user(user)
-            return Response({
+        # The serializer has already verified the password, so reuse its user
+        # instead of calling authenticate() and hashing the password again.
+        user = serializer.validated_data['user']
+        refresh = IndexedRefreshToken.for_user(user)
+        return Response({
             'message': 'Login successful',
             'tokens': {
                 'refresh': str(refresh),
@@ -43,8 +59,6 @@ def login_user(request):
                 'role': user.role
             }
         })
-        
-        return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -69,3 +83,150 @@ def logout_user(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def refresh_token(request):
+    """
+    Exchanges a refresh token for a new access token (and a rotated refresh
+    token). Blacklist checks go through the in-memory revocation index.
+    """
+    serializer = TokenRefreshSerializer(data=request.data)
+    try:
+        if serializer.is_valid():
+            return Response(serializer.validated_data, status=status.HTTP_200_OK)
+    except TokenError:
+        return Response(
+            {"error": "Invalid or expired token"},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Async (ASGI) variants of the auth endpoints. DRF views are synchronous, so
+# these are plain Django async views: they reuse the serializers' field
+# validation, query with the async ORM and run password hashing off the event loop.
+
+def parse_fields(serializer_class, request):
+    """
+    Decode the JSON body and run the serializer's field-level validation only.
+    Database-backed validators are dropped here; callers check them with the async ORM.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise serializers.ValidationError({'error': ['Invalid JSON body.']})
+    serializer = serializer_class(data=data)
+    for field in serializer.fields.values():
+        field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+    return serializer.to_internal_value(data)
+
+
+async def run_hashing(func, *args):
+    """Run a password hashing call on the hashing pool, or the loop's default executor."""
+    executor = get_hashing_executor()
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def check_user_password(user, password):
+    """
+    `user.check_password` for worker threads. A rehash saves the user on
+    this thread's own connection, which nothing in the request cycle would
+    close, so close it here.
+    """
+    try:
+        return user.check_password(password)
+    finally:
+        connection.close()
+
+
+# Throttle checks call the cache synchronously (a network round trip with
+# redis), so the async views run them off the event loop.
+@csrf_exempt
+@require_POST
+async def register_user_async(request):
+    throttled = await sync_to_async(throttled_response, thread_sensitive=False)(request, REGISTER_THROTTLES)
+    if throttled is not None:
+        return throttled
+    try:
+        attrs = parse_fields(UserRegistrationSerializer, request)
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(username=attrs['username']).aexists():
+        return JsonResponse({'username': ['A user with that username already exists.']}, status=status.HTTP_400_BAD_REQUEST)
+    if attrs['role'] == 'parent':
+        return JsonResponse({'role': ['Only admins can create Parent users.']}, status=status.HTTP_400_BAD_REQUEST)
+    if await User.objects.filter(email=attrs.get('email')).aexists():
+        return JsonResponse({'email': ['Email is already taken.']}, status=status.HTTP_400_BAD_REQUEST)
+    if attrs['password'] != attrs.pop('password2'):
+        return JsonResponse({'password': ['Passwords do not match.']}, status=status.HTTP_400_BAD_REQUEST)
+
+    attrs['password'] = await run_hashing(make_password, attrs['password'])
+    try:
+        await User.objects.acreate(**attrs)
+    except IntegrityError:
+        return JsonResponse({'error': ['A user with that username or email already exists.']}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({"message": "User created successfully!"}, status=status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+@require_POST
+async def login_user_async(request):
+    throttled = await sync_to_async(throttled_response, thread_sensitive=False)(request, LOGIN_THROTTLES)
+    if throttled is not None:
+        return throttled
+    try:
+        attrs = parse_fields(LoginSerializer, request)
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    user = await User.objects.filter(username=attrs['username']).afirst()
+    if user is None:
+        return JsonResponse({'error': ['User not found...']}, status=status.HTTP_400_BAD_REQUEST)
+
+    # check_password may rehash and save the user, so it needs a thread, not a process
+    executor = get_hashing_executor()
+    if isinstance(executor, ThreadPoolExecutor):
+        valid = await asyncio.get_running_loop().run_in_executor(executor, check_user_password, user, attrs['password'])
+    else:
+        valid = await sync_to_async(check_user_password, thread_sensitive=False)(user, attrs['password'])
+    if not valid:
+        return JsonResponse({'error': ['Incorrect password.']}, status=status.HTTP_400_BAD_REQUEST)
+    if not user.is_active:
+        return JsonResponse({'error': ['User account is not active.']}, status=status.HTTP_400_BAD_REQUEST)
+    if not user.is_approved:
+        return JsonResponse({'error': ['User account is not approved.']}, status=status.HTTP_400_BAD_REQUEST)
+
+    refresh = await sync_to_async(IndexedRefreshToken.for_user)(user)
+    return JsonResponse({
+        'message': 'Login successful',
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        },
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': user.role
+        }
+    })
+
+
+@csrf_exempt
+@require_POST
+async def logout_user_async(request):
+    try:
+        attrs = parse_fields(LogoutSerializer, request)
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    def blacklist():
+        IndexedRefreshToken(attrs['refresh']).blacklist()
+
+    try:
+        await sync_to_async(blacklist)()
+    except TokenError:
+        return JsonResponse(['Invalid or expired token'], safe=False, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({"message": "Successfully logged out"}, status=status.HTTP_200_OK)